@@ -1,6 +1,7 @@
+import BC_utils
 from BC_utils import (UpdateMetabolites, select_daughter_neighbor, 
                       acquire_phenotypes, get_targeting_neighbor)
-from cellularautomata_BC import GuiCA
+from cellularautomata_BC import Branch, errmsg
 from random import random, seed
 
 seed(10)
@@ -22,6 +23,15 @@ moores = [
     ]
 
 
+def SetParams(**params):
+    """Set model parameters (a0, pa, k, hN, hT, dg, dc) of the rule BC and of the metabolite update of BC_utils,
+    e.g. SetParams(a0=0.05). Unknown names raise an error."""
+    for name, value in params.items():
+        assert name in ("a0", "pa", "k", "hN", "hT", "dg", "dc"), errmsg("Unknown parameter", name)
+        globals()[name] = value
+        setattr(BC_utils, name, value)
+
+
 def BC(cell, neighbors):
     phenotype, env = cell
     
@@ -30,6 +40,7 @@ def BC(cell, neighbors):
     
     # ------------------ updating empty element
     if phenotype == "empty":
+        Branch("empty")
         chosen_by = get_targeting_neighbor(neighbors)
         if chosen_by is None: 
             return (phenotype, (gluc_level, oxy_level, h_level, (None, None)))
@@ -49,6 +60,7 @@ def BC(cell, neighbors):
         p_death = 1
     
     if random() < p_death:
+        Branch("death by acid", phenotype)
         return ("empty", (gluc_level, oxy_level, h_level, (None, None)))
 
     # ------------------ 4. CELL DIVISION ------------------
@@ -60,6 +72,7 @@ def BC(cell, neighbors):
 
     # cell will die if produce ATP (phiA) < a0
     if phiA < a0:
+        Branch("death by ATP", phenotype)
         return ("empty", (gluc_level, oxy_level, h_level, (None, None)))
     elif phiA < 1 and phiA > a0:
         p_division = (phiA - a0) / (1-a0)
@@ -67,6 +80,7 @@ def BC(cell, neighbors):
         p_division = 1
 
     if not random() < p_division: # no division, stay quiescent (same phenotype)
+        Branch("quiescent", phenotype)
         return (phenotype, (gluc_level, oxy_level, h_level, (None, None)))
         
     else:
@@ -77,6 +91,7 @@ def BC(cell, neighbors):
                 empty_neighbors_o2[i] = env[1] # store oxygen level of empty neighbors
 
         if len(empty_neighbors_o2) == 0:
+            Branch("blocked division", phenotype)  # no room for the daughter cell
             return (phenotype, (gluc_level, oxy_level, h_level, (None, None)))
         elif len(empty_neighbors_o2) == 1:
             daughter_index = list(empty_neighbors_o2.keys())[0]
@@ -85,15 +100,20 @@ def BC(cell, neighbors):
 
         if daughter_index is not None: 
             # if a location is found for daughter cells, choose phenotype
-            daughter1_phenotype = acquire_phenotypes(phenotype)
-            daughter2_phenotype = acquire_phenotypes(phenotype)
+            daughter1_phenotype = acquire_phenotypes(phenotype, pa)
+            daughter2_phenotype = acquire_phenotypes(phenotype, pa)
+            Branch("division", phenotype)
+            if daughter1_phenotype != phenotype:
+                Branch("mutation", phenotype)
+            if daughter2_phenotype != phenotype:
+                Branch("mutation", phenotype)
             return (daughter1_phenotype, (gluc_level, oxy_level, h_level, (daughter_index, daughter2_phenotype)))
         else:
             return (phenotype, (gluc_level, oxy_level, h_level, (None, None)))
 
 # ===================== Main program =====================
-N = 50
-M = 50
+N = 50         # number of rows, the basement membrane is the last one
+M = 50         # number of columns
 g_base = 1.0 
 c_base = 1.0
 h_base = 0.0
@@ -137,4 +157,6 @@ cellcolors = {('empty', (0.0, 0.0, 0.0, (None, None))): 'white',
               ('AG', (None, None, None, (None, None))): 'black', 
               ('AGH', (None, None, None, (None, None))): '#eecb4a'} # yellow
 
-GuiCA(BC, cellcolors, gridsize=100, duration=800)
+if __name__ == "__main__":  # the rule and the colors can be imported (e.g. by spawned workers) without loading the GUI
+    from cellularautomata_BC import GuiCA
+    GuiCA(BC, cellcolors, gridsize=(2 * N, 2 * M), duration=800)  # the GUI starts with a N x M grid
@@ -0,0 +1,207 @@
+
+# Benchmark suite of the BC model.
+# Time and peak memory of the hot paths at several grid sizes and tumor occupancies, saved as JSON so that
+# the speedups of new engines can be followed over time.
+#   python BC_bench.py --sizes 50 100 200 400 --output benchmark.json
+
+import argparse
+import csv
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import cellularautomata_BC
+from BC import BC, cellcolors
+from BC_utils import UpdateMetabolites, acquire_phenotypes, get_targeting_neighbor, select_daughter_neighbor
+from BC_fast import StepBC_fast, DefaultParams
+from cellularautomata_BC import (GenerateCA_BC, SimulateCA_BC, TypesCount, WriteCellCounts, EncodeCA, CodeStack, CodeCounts,
+                                 LoadCheckpoint, Moore, errmsg)
+
+SIZES = (50, 100, 200, 400)
+TYPES = [category for category, *_ in cellcolors]
+
+
+def Compositions(directory: str = "cellcounts", quantiles=(0.25, 0.5, 0.9)) -> list[dict[str, float]]:
+    """Tumor compositions observed in saved cell counts: the rows of the csv files at the given quantiles of the occupancy.
+
+    Args:
+        directory (str, optional): folder of the csv files written by ShowSimulation. Default "cellcounts".
+        quantiles (tuple, optional): quantiles of the occupancy = occupied cells / grid cells. Default (0.25, 0.5, 0.9).
+
+    Returns:
+        list[dict[str, float]]: {type: fraction of the grid} for each quantile, empty cells excluded.
+    """
+    rows = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        with open(filename, newline="") as file:
+            for row in csv.DictReader(file):
+                total = sum(int(row[category]) for category in TYPES)
+                rows.append({category: int(row[category]) / total for category in TYPES if category != "empty"})
+    assert rows, errmsg("no cell counts in", directory)
+    rows.sort(key=lambda composition: sum(composition.values()))
+    return [rows[min(int(q * len(rows)), len(rows) - 1)] for q in quantiles]
+
+
+def TumorState(n: int, composition: dict[str, float], m: int = None) -> np.ndarray:
+    """Initial automaton of GenerateCA_BC filled from the basement membrane upwards with a tumor of the given composition.
+
+    Args:
+        n (int): number of rows.
+        composition (dict[str, float]): {type: fraction of the grid}, see Compositions.
+        m (int, optional): number of columns. Default n.
+
+    Returns:
+        np.ndarray: cellular automaton.
+    """
+    m = n if m is None else m
+    cellautomaton = GenerateCA_BC(n, cellcolors, m=m)
+    cells = [category for category, fraction in composition.items() for _ in range(round(fraction * n * m))]
+    random.shuffle(cells)
+    for position, category in enumerate(cells[:n * m]):
+        i, j = n - 1 - position // m, position % m
+        cellautomaton[i, j] = (category, cellautomaton[i, j, 1])
+    return cellautomaton
+
+
+def Measure(fun, repeat: int = 3) -> dict:
+    """Best wall time over repeat calls of fun, and its peak memory allocation measured by tracemalloc in an extra call.
+
+    Args:
+        fun (fun): function without argument.
+        repeat (int, optional): number of timed calls. Default 3.
+
+    Returns:
+        dict: seconds, peak_bytes and calls.
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fun()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    fun()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak, "calls": repeat}
+
+
+def Neighbors(cellautomaton: np.ndarray) -> np.ndarray:
+    """Moore neighbors of every cell with the mirrored borders of SimulateCA_BC, as lists of (type, metabolites)."""
+    n, m = cellautomaton.shape[:2]
+    padded = np.full((n + 2, m + 2, 2), ("empty", (0.0, 0.0, 0.0, (None, None))), dtype=object)
+    padded[1:-1, 1:-1] = cellautomaton
+    padded[1:-1, 0], padded[1:-1, -1] = cellautomaton[:, 0], cellautomaton[:, -1]
+    padded[0, 1:-1], padded[-1, 1:-1] = cellautomaton[0], cellautomaton[-1]
+    neighbors = np.empty((n, m), dtype=object)
+    for i in range(n):
+        for j in range(m):
+            neighbors[i, j] = [(padded[i+1+di, j+1+dj, 0], padded[i+1+di, j+1+dj, 1]) for di, dj in Moore(1)]
+    return neighbors
+
+
+def HotPaths(cellautomaton: np.ndarray, tmpfile: str) -> dict:
+    """Functions without argument running each hot path once on the automaton."""
+    n, m = cellautomaton.shape[:2]
+    neighbors = Neighbors(cellautomaton)
+    phenotypes = [category for category in cellautomaton[:, :, 0].ravel() if category != "empty"] or ["normal"]
+    emptyneighbors = [neighbors[i, j] for i, j in np.argwhere(cellautomaton[:, :, 0] == "empty")]
+    oxygens = [{index: env[1] for index, (category, env) in enumerate(cellneighbors) if category == "empty"}
+               for cellneighbors in neighbors.ravel()]
+    oxygens = [o2 for o2 in oxygens if len(o2) > 1]
+    trace = [cellautomaton] * 10
+    typescount = TypesCount(trace, TYPES)
+    state = EncodeCA(cellautomaton, TYPES)
+    params, rng = DefaultParams(), np.random.default_rng(0)
+
+    return {
+        "GenerateCA_BC": lambda: GenerateCA_BC(n, cellcolors, m=m),
+        "SimulateCA_BC step": lambda: SimulateCA_BC(cellautomaton, BC, duration=1),
+        "SimulateCA_BC step (full grid)": lambda: SimulateCA_BC(cellautomaton, BC, duration=1, active=False),
+        "StepBC_fast": lambda: StepBC_fast(state, params, rng),
+        "UpdateMetabolites grid": lambda: [UpdateMetabolites(cellautomaton[i, j, 0], neighbors[i, j]) for i in range(n) for j in range(m)],
+        "acquire_phenotypes": lambda: [acquire_phenotypes(phenotype) for phenotype in phenotypes],
+        "get_targeting_neighbor": lambda: [get_targeting_neighbor(cellneighbors) for cellneighbors in emptyneighbors],
+        "select_daughter_neighbor": lambda: [select_daughter_neighbor(o2) for o2 in oxygens],
+        "typescount (10 steps)": lambda: TypesCount(trace, TYPES),
+        "code stack + counts (10 steps)": lambda: CodeCounts(CodeStack(trace, TYPES), TYPES),
+        "csv writing (10 steps)": lambda: WriteCellCounts(typescount, tmpfile),
+    }, {"acquire_phenotypes": len(phenotypes), "get_targeting_neighbor": len(emptyneighbors),
+        "select_daughter_neighbor": len(oxygens)}
+
+
+def Benchmark(sizes=SIZES, compositions: list = None, checkpoints: list = (), repeat: int = 3, seed: int = 0) -> dict:
+    """Run the hot paths at every size and tumor composition, and on the automata of saved checkpoints.
+
+    Args:
+        sizes (tuple, optional): grid sizes n (n x n grids). Default (50, 100, 200, 400).
+        compositions (list, optional): tumor compositions, see Compositions. Default None = Compositions().
+        checkpoints (list, optional): checkpoint files (see SaveCheckpoint) benchmarked at their own size. Default ().
+        repeat (int, optional): timed calls of each hot path. Default 3.
+        seed (int, optional): seed of the random generator. Default 0.
+
+    Returns:
+        dict: meta (date, versions, commit) and results, one record per hot path, state and size.
+    """
+    compositions = Compositions() if compositions is None else compositions
+    random.seed(seed)
+    states = [(f"q{index}", composition, lambda n, composition=composition: TumorState(n, composition))
+              for index, composition in enumerate(compositions)]
+    tmpfile = "benchmark_counts.csv"
+
+    def bench(label: str, cellautomaton: np.ndarray):
+        n, m = cellautomaton.shape[:2]
+        occupancy = float(np.mean(cellautomaton[:, :, 0] != "empty"))
+        paths, items = HotPaths(cellautomaton, tmpfile)
+        for name, fun in paths.items():
+            record = {"name": name, "state": label, "n": n, "m": m, "occupancy": occupancy} | Measure(fun, repeat)
+            if name in items:
+                record["items"] = items[name]
+                record["items_per_second"] = items[name] / record["seconds"] if record["seconds"] > 0 else None
+            results.append(record)
+            print(f"{name:32}{label:>12}{n:>6}{occupancy:>8.2f}{record['seconds']:>12.5f} s{record['peak_bytes'] / 2**20:>10.2f} MiB")
+
+    results = []
+    progress, cellularautomata_BC._PROGRESS = cellularautomata_BC._PROGRESS, False  # No progress bar in the timings.
+    try:
+        for n in sizes:
+            for label, _, make in states:
+                bench(label, make(n))
+        for path in checkpoints:
+            bench(os.path.basename(path), LoadCheckpoint(path)["cellautomaton"])
+    finally:
+        cellularautomata_BC._PROGRESS = progress
+    if os.path.exists(tmpfile):
+        os.remove(tmpfile)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"), "commit": commit, "python": platform.python_version(),
+                 "numpy": np.__version__, "machine": platform.machine(), "repeat": repeat, "seed": seed,
+                 "compositions": compositions},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the hot paths of the BC model.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="grid sizes")
+    parser.add_argument("--checkpoints", nargs="*", default=[], help="checkpoint files of saved states")
+    parser.add_argument("--counts", default="cellcounts", help="folder of the cell counts giving the tumor occupancies")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls of each hot path")
+    parser.add_argument("--output", default="benchmark.json", help="JSON result file")
+    args = parser.parse_args()
+
+    report = Benchmark(args.sizes, Compositions(args.counts), args.checkpoints, args.repeat)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=1)
+    print("Results saved to", args.output)
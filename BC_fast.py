@@ -0,0 +1,432 @@
+
+# Vectorized engine of the BC model.
+# The rule of BC.py is applied to the whole grid at once with numpy on the typed arrays of EncodeCA
+# (type codes, glucose, oxygen, H+, daughter target and daughter type). Metabolite updates are the same operations
+# as UpdateMetabolites; random draws are taken from a numpy generator in a different order than the reference
+# engine, so trajectories only agree statistically with SimulateCA_BC + BC.
+
+import numpy as np
+import BC_utils
+from BC_utils import classify_pathway
+from cellularautomata_BC import EncodeCA, SimulationTrace, Termination, CountWriter, CodeStack, Moore, EVENTS, _progress
+
+TRAITS = {"A": 1, "G": 2, "H": 4}  # bit of each trait in a trait mask
+MOORE1 = Moore(1)
+CRN_DRAWS = 11  # Uniform numbers per cell and step with common random numbers: death, division, choice of a neighbor, 2 x 4 mutation.
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(8)])
+NTH = np.zeros((8, 3), dtype=np.uint8)  # NTH[mask, r] = r-th trait of mask in alphabetical order A < G < H
+for _mask in range(8):
+    for _r, _bit in enumerate(bit for bit in (1, 2, 4) if _mask & bit):
+        NTH[_mask, _r] = _bit
+
+
+def DefaultParams() -> dict:
+    """Return the model parameters of BC_utils: a0, pa, k, hN, hT, dg and dc."""
+    return {name: getattr(BC_utils, name) for name in ("a0", "pa", "k", "hN", "hT", "dg", "dc")}
+
+
+def _tables(types: list):
+    """Trait mask of each type code and type code of each trait mask."""
+    codes = {category: i for i, category in enumerate(types)}
+    masks = np.zeros(len(types), dtype=np.uint8)
+    for category, code in codes.items():
+        if category not in ("empty", "normal"):
+            masks[code] = sum(TRAITS[trait] for trait in category)
+    bymask = np.full(8, 255, dtype=np.uint8)
+    for category, code in codes.items():
+        if category != "empty":
+            bymask[masks[code]] = code
+    assert "empty" in codes and (bymask != 255).all(), "types must contain empty, normal and the 7 trait combinations"
+    return codes["empty"], masks, bymask
+
+
+def _acquire(parent: np.ndarray, pa: float, rng, u: np.ndarray = None) -> np.ndarray:
+    """Vectorized acquire_phenotypes on trait masks: with probability pa a normal cell gains a trait,
+    other cells gain, lose or switch one trait, each action with probability 1/3.
+    The 4 uniform numbers of each cell are drawn from rng, or taken from u (4, parent.size) if given."""
+    u = rng.random((4, parent.size)) if u is None else u
+    count = POPCOUNT[parent]
+    missing = 7 & ~parent
+    daughter = parent.copy()
+
+    mutate = u[0] < pa
+    action = (u[1] * 3).astype(int)
+
+    gain0 = mutate & (parent == 0)
+    daughter[gain0] = NTH[7, action[gain0]]
+    gain = mutate & (parent != 0) & (action == 0) & (missing != 0)
+    daughter[gain] |= NTH[missing[gain], (u[2][gain] * POPCOUNT[missing[gain]]).astype(int)]
+    lose = mutate & (parent != 0) & (action == 1)
+    daughter[lose] &= ~NTH[parent[lose], (u[2][lose] * count[lose]).astype(int)]
+    switch = mutate & (parent != 0) & (action == 2)  # lose a trait then gain one of the missing traits, if any
+    daughter[switch] &= ~NTH[parent[switch], (u[2][switch] * count[switch]).astype(int)]
+    added = NTH[missing[switch], (u[3][switch] * POPCOUNT[missing[switch]]).astype(int)]
+    daughter[switch] |= np.where(missing[switch] != 0, added, 0).astype(np.uint8)
+    return daughter
+
+
+def _pick(candidates: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """Index of a uniformly chosen True along the first axis of candidates (8, ...), using the uniform numbers u."""
+    count = candidates.sum(0)
+    rank = (u * count).astype(int)
+    return np.argmax(np.cumsum(candidates, axis=0) > rank, axis=0)
+
+
+class Lineage:
+    """Clone lineage of a run of the vectorized engine. Every cell carries a clone id (int32 array "clone" of the
+    state, -1 for empty cells, and "daughterclone" for the pending daughters). A daughter whose phenotype differs from
+    its parent's founds a new clone, recorded in a growable structure-of-arrays table with its id, parent clone, step,
+    type code and position. The founders of the initial automaton are one root clone per type (parent -1, step 0,
+    position -1). Every prune steps, the clones which are neither alive nor ancestors of a living clone are removed,
+    so the table stays bounded while the phylogeny of the living clones can still be rebuilt.
+
+    Args:
+        prune (int, optional): steps between two prunings, 0 = never. Default 100.
+        capacity (int, optional): initial capacity of the table, doubled when full. Default 1024.
+
+    Attributes:
+        size (int): number of recorded clones.
+        step (int): current step, set by SimulateCA_BC_fast.
+    """
+
+    FIELDS = {"id": np.int32, "parent": np.int32, "step": np.int32, "code": np.uint8, "row": np.int32, "column": np.int32}
+
+    def __init__(self, prune: int = 100, capacity: int = 1024):
+        assert prune >= 0 and capacity > 0
+        self.interval = prune
+        self.columns = {field: np.zeros(capacity, dtype=dtype) for field, dtype in self.FIELDS.items()}
+        self.size = 0
+        self.next = 0  # Next clone id, ids increase along the table.
+        self.step = 0
+
+    def record(self, parent: np.ndarray, code: np.ndarray, row: np.ndarray, column: np.ndarray) -> np.ndarray:
+        """Add new clones at the current step and return their ids."""
+        number = len(parent)
+        if self.size + number > len(self.columns["id"]):
+            capacity = max(2 * len(self.columns["id"]), self.size + number)
+            for field, values in self.columns.items():
+                self.columns[field] = np.resize(values, capacity)
+        ids = np.arange(self.next, self.next + number, dtype=np.int32)
+        new = slice(self.size, self.size + number)
+        for field, values in zip(self.FIELDS, (ids, parent, self.step, code, row, column)):
+            self.columns[field][new] = values
+        self.size += number
+        self.next += number
+        return ids
+
+    def founders(self, code: np.ndarray, empty: int) -> np.ndarray:
+        """Clone ids of the cells of an initial automaton: one root clone per type."""
+        present = np.unique(code[code != empty])
+        ids = self.record(np.full(len(present), -1), present, np.full(len(present), -1), np.full(len(present), -1))
+        clone = np.full(code.shape, -1, dtype=np.int32)
+        for category, clone_id in zip(present, ids):
+            clone[code == category] = clone_id
+        return clone
+
+    def prune(self, state: dict):
+        """Remove the clones which are neither alive in the state (cells or pending daughters) nor their ancestors."""
+        ids, parents = self.table("id"), self.table("parent")
+        keep = np.isin(ids, np.concatenate([state["clone"].ravel(), state["daughterclone"].ravel()]))
+        frontier = keep
+        while frontier.any():  # climb one generation of ancestors at a time
+            ancestors = np.isin(ids, parents[frontier]) & ~keep
+            keep |= ancestors
+            frontier = ancestors
+        for field, values in self.columns.items():
+            kept = values[:self.size][keep]
+            values[:len(kept)] = kept
+        self.size = int(keep.sum())
+
+    def table(self, field: str = None):
+        """Recorded clones, {field: values} or the values of one field, as views valid until the next record or prune."""
+        if field is not None:
+            return self.columns[field][:self.size]
+        return {name: values[:self.size] for name, values in self.columns.items()}
+
+    def ancestry(self, clone: int) -> list[dict]:
+        """Records of a clone and of its ancestors, from its root clone to itself."""
+        ids = self.table("id")
+        records = []
+        while clone >= 0:
+            index = np.searchsorted(ids, clone)
+            assert index < self.size and ids[index] == clone, f"clone {clone} was pruned"
+            records.append({field: values[index].item() for field, values in self.table().items()})
+            clone = records[-1]["parent"]
+        return records[::-1]
+
+    def sizes(self, state: dict) -> dict[int, int]:
+        """Number of cells of every living clone, largest first."""
+        ids, counts = np.unique(state["clone"][state["clone"] >= 0], return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        return dict(zip(ids[order].tolist(), counts[order].tolist()))
+
+
+def StepBC_fast(state: dict, params: dict, rng, tables=None, crn: bool = False, lineage: Lineage = None) -> tuple[dict, dict]:
+    """Compute one step of the BC model on an encoded automaton (see EncodeCA).
+
+    Args:
+        state (dict): encoded automaton, the metabolite arrays keep their dtype.
+        params (dict): model parameters, see DefaultParams.
+        rng (np.random.Generator): random generator.
+        tables (optional): type tables of _tables, computed from state["types"] if None.
+        crn (bool, optional): common random numbers, every cell draws its numbers at its position in fixed grids
+            (CRN_DRAWS uniform numbers per cell), so the draws do not depend on the parameters. Default False.
+        lineage (Lineage, optional): clone lineage, updating the arrays clone and daughterclone of the state. Default None.
+
+    Returns:
+        tuple[dict, dict]: new encoded automaton and the events of the step: number of deaths and divisions, and causes,
+            the counters of the outcomes by phenotype (array (len(EVENTS), number of types), see EventCounter).
+    """
+    empty, masks, bymask = tables or _tables([str(category) for category in state["types"]])
+    a0, pa, k, hN, hT, dg, dc = (params[name] for name in ("a0", "pa", "k", "hN", "hT", "dg", "dc"))
+    code = state["code"]
+    n, m = code.shape
+    dtype = state["glucose"].dtype
+
+    # Padded arrays: mirrored borders and empty corners as in SimulateCA_BC.
+    def pad(array: np.ndarray, corner) -> np.ndarray:
+        padded = np.pad(array, 1, mode="edge")
+        padded[[0, 0, -1, -1], [0, -1, 0, -1]] = corner
+        return padded
+
+    def shift(padded: np.ndarray, index: int) -> np.ndarray:  # Neighbor of index in MOORE1 of every cell.
+        di, dj = MOORE1[index]
+        return padded[1+di:1+di+n, 1+dj:1+dj+m]
+
+    pcode, ptarget, pdaughter = pad(code, empty), pad(state["target"], -1), pad(state["daughter"], 255)
+    pglucose, poxygen, pacid = (pad(state[key], 0) for key in ("glucose", "oxygen", "acid"))
+
+    # ------------------ 1. UPDATING LEVELS OF GLUCOSE, O2, AND H+ (UpdateMetabolites) ------------------
+    traits = masks[code]
+    isempty = code == empty
+    glycolytic = (traits & TRAITS["G"]) > 0
+
+    def vonneumann(padded: np.ndarray) -> np.ndarray:  # Same summation order as UpdateMetabolites.
+        return ((shift(padded, 1) + shift(padded, 3)) + shift(padded, 4)) + shift(padded, 6)
+
+    deltaG = np.where(isempty, 0, np.where(glycolytic, k / (dg**2), 1 / (dg**2))).astype(dtype)
+    deltaO = np.where(isempty, 0, 1 / (dc**2)).astype(dtype)
+    glucose = vonneumann(pglucose) / (4 + deltaG)
+    oxygen = vonneumann(poxygen) / (4 + deltaO)
+    deltaH = np.where(isempty, 0, np.where(glycolytic, k * glucose - oxygen, np.where(glucose > oxygen, glucose - oxygen, 0)))
+    acid = (vonneumann(pacid) + deltaH.astype(dtype)) / 4
+
+    u = rng.random((CRN_DRAWS if crn else 3, n, m))
+    newcode = code.copy()
+    newtarget = np.full((n, m), -1, dtype=np.int8)
+    newdaughter = np.full((n, m), 255, dtype=np.uint8)
+
+    # ------------------ updating empty elements (get_targeting_neighbor) ------------------
+    # A neighbor targets the cell if its displacement is the opposite of its position; the scan of the
+    # neighbors stops at the first neighbor whose target is a neighbor index.
+    neighbortarget = np.array([shift(ptarget, index) for index in range(8)])
+    targeting = neighbortarget == (7 - np.arange(8))[:, None, None]
+    stopped = np.cumsum(neighbortarget >= 8, axis=0) - (neighbortarget >= 8) > 0
+    targeting &= ~stopped & isempty
+    targeted = targeting.any(0)
+    chosen = _pick(targeting, u[2])
+    neighbordaughter = np.array([shift(pdaughter, index) for index in range(8)])
+    newcode[targeted] = np.take_along_axis(neighbordaughter, chosen[None], 0)[0][targeted]
+
+    # ------------------ 2. CELL DEATH ------------------
+    occupied = ~isempty
+    h_threshold = np.where(traits & TRAITS["A"], hT, hN)
+    p_death = np.where(acid < h_threshold, acid / h_threshold, 1)
+    dead = occupied & (u[0] < p_death)
+
+    # ------------------ 4. CELL DIVISION ------------------
+    phiG = np.where(glycolytic, k * glucose, glucose)
+    phiA = oxygen + (phiG - oxygen) / 18
+    starved = occupied & ~dead & (phiA < a0)
+    dead |= starved
+    p_division = np.where(phiA >= 1, 1, (phiA - a0) / (1 - a0))
+    dividing = occupied & ~dead & (u[1] < p_division)
+
+    emptyneighbors = np.array([shift(pcode, index) == empty for index in range(8)])
+    count = emptyneighbors.sum(0)
+    # One empty neighbor: the daughter target is its index. More: the displacement to the neighbor with the highest O2.
+    single = dividing & (count == 1)
+    newtarget[single] = 8 + np.argmax(emptyneighbors, axis=0)[single]
+    several = dividing & (count >= 2)
+    neighboroxygen = np.where(emptyneighbors, np.array([shift(poxygen, index) for index in range(8)]), -np.inf)
+    best = emptyneighbors & (neighboroxygen == neighboroxygen.max(0))
+    newtarget[several] = _pick(best, u[2])[several]
+
+    divided = single | several
+    parents = traits[divided]
+    if crn:
+        newcode[divided] = bymask[_acquire(parents, pa, rng, u[3:7, divided])]
+        newdaughter[divided] = bymask[_acquire(parents, pa, rng, u[7:11, divided])]
+    else:
+        newcode[divided] = bymask[_acquire(parents, pa, rng)]
+        newdaughter[divided] = bymask[_acquire(parents, pa, rng)]
+    newcode[dead] = empty
+
+    def tally(cells: np.ndarray, weights: np.ndarray = None) -> np.ndarray:  # Number of cells by phenotype.
+        return np.bincount(code[cells], weights, minlength=len(masks)).astype(np.int64)
+
+    mutations = (masks[newcode[divided]] != parents).astype(int) + (masks[newdaughter[divided]] != parents)
+    causes = np.stack([tally(dead & ~starved), tally(starved), tally(occupied & ~dead & ~dividing),
+                       tally(dividing & ~divided), tally(divided), tally(divided, mutations)])  # in the order of EVENTS
+
+    if lineage is not None:  # Placed daughters bring their clone, mutated daughters found new clones.
+        clone = state["clone"].copy()
+        pdaughterclone = pad(state["daughterclone"], -1)
+        neighborclone = np.array([shift(pdaughterclone, index) for index in range(8)])
+        clone[targeted] = np.take_along_axis(neighborclone, chosen[None], 0)[0][targeted]
+        newdaughterclone = np.full((n, m), -1, dtype=np.int32)
+        rows, columns = np.nonzero(divided)
+        parentclone = state["clone"][divided]
+        for daughter, newclone in ((newcode, clone), (newdaughter, newdaughterclone)):
+            codes = daughter[divided]
+            mutated = masks[codes] != parents
+            newclone[divided] = parentclone
+            newclone[rows[mutated], columns[mutated]] = lineage.record(parentclone[mutated], codes[mutated],
+                                                                       rows[mutated], columns[mutated])
+        clone[dead] = -1
+
+    # ------------------ basement membrane and detachment (SimulateCA_BC) ------------------
+    glucose[-1], oxygen[-1], acid[-1] = 1.0, 1.0, 0.0
+    detached = (masks[newcode] & TRAITS["H"]) == 0
+    detached[-1] = False
+    newcode[detached] = empty
+    newtarget[detached] = -1
+    newdaughter[detached] = 255
+
+    new = {"types": state["types"], "code": newcode, "glucose": glucose, "oxygen": oxygen, "acid": acid,
+           "target": newtarget, "daughter": newdaughter}
+    if lineage is not None:
+        clone[detached] = -1
+        newdaughterclone[detached] = -1
+        new |= {"clone": clone, "daughterclone": newdaughterclone}
+    return new, {"death": int(dead.sum()), "division": int(divided.sum()), "causes": causes}
+
+
+def SimulateCA_BC_fast(cellautomaton0, types: list, duration: int = 100, seed=None, params: dict = None,
+                       dtype=np.float64, termination: Termination = None, record: int = 1,
+                       counts: CountWriter = None, crn: bool = False, lineage: Lineage = None) -> SimulationTrace:
+    """Simulation of the BC model with the vectorized engine.
+
+    Args:
+        cellautomaton0 (np.ndarray | dict): initial cellular automaton, possibly encoded.
+        types (list): all the cell types, e.g. the types of cellcolors.
+        duration (int, optional): maximal number of steps. Default 100.
+        seed (optional): seed of the numpy random generator. Default None.
+        params (dict, optional): model parameters overriding DefaultParams. Default None.
+        dtype (optional): precision of the metabolite levels, np.float64 or np.float32. Default np.float64.
+        termination (Termination, optional): conditions stopping the simulation before duration. Default None.
+        record (int, optional): keep one automaton every record steps in the trace (the last one is always kept). Default 1.
+        counts (CountWriter, optional): sink receiving the cell counts of every step. Default None.
+        crn (bool, optional): common random numbers: the draws of a cell depend only on the seed, the step, its position
+            and their purpose (see StepBC_fast), so that runs with the same seed and different parameters share their
+            random numbers and their differences have a low variance. Default False.
+        lineage (Lineage, optional): track the clones, the states then hold the arrays clone and daughterclone.
+            Default None.
+
+    Returns:
+        SimulationTrace: trace of encoded automata (see Dense to decode them) with the attributes steps,
+            typescount = {type: count per step}, events = {"death": count per step, "division": count per step},
+            causes (event counters of every step, see EventCounter) and lineage.
+    """
+    assert duration > 0
+    assert record > 0
+    assert not crn or seed is not None, "common random numbers need a seed"
+    params = DefaultParams() | (params or {})
+    tables = _tables(types)
+    rng = np.random.default_rng(seed)
+
+    state = EncodeCA(cellautomaton0, types) if isinstance(cellautomaton0, np.ndarray) else dict(cellautomaton0)
+    for key in ("glucose", "oxygen", "acid"):
+        state[key] = state[key].astype(dtype)
+    if lineage is not None and "clone" not in state:
+        state["clone"] = lineage.founders(state["code"], tables[0])
+        state["daughterclone"] = np.where(state["daughter"] != 255, state["clone"], -1).astype(np.int32)
+
+    simulation = SimulationTrace([state])
+    simulation.lineage = lineage
+    simulation.steps = [0]
+    simulation.typescount = {category: [] for category in types}
+    simulation.events = {"death": [0], "division": [0]}
+    simulation.causes = [np.zeros((len(EVENTS), len(types)), dtype=np.int64)]
+
+    def count(step: int, state: dict) -> dict:
+        for category, number in zip(types, np.bincount(state["code"].ravel(), minlength=len(types))):
+            simulation.typescount[category].append(int(number))
+        last = {category: simulation.typescount[category][-1] for category in types}
+        if counts is not None:
+            caused = simulation.causes[-1]
+            if counts.events and counts.types != types:  # rows of the types of the writer
+                caused = caused[:, [types.index(category) for category in counts.types]]
+            counts.write(step, last, CodeStack([state], counts.types)[0] if counts.stats else None, caused)
+        return last
+
+    if counts is not None:
+        counts.open(state["code"].shape, "SimulateCA_BC_fast" + ("" if dtype == np.float64 else f" ({np.dtype(dtype).name})"),
+                    params=params, seed=seed)
+    initial = count(0, state)
+    if termination is not None:
+        termination.reset(initial)
+    completed = False
+    try:
+        for step in _progress(range(1, duration + 1)):
+            if crn:  # one stream per step, keyed by (seed, step)
+                rng = np.random.default_rng([seed, step])
+            if lineage is not None:
+                lineage.step = step
+            state, events = StepBC_fast(state, params, rng, tables, crn, lineage)
+            if lineage is not None and lineage.interval and step % lineage.interval == 0:
+                lineage.prune(state)
+            simulation.causes.append(events.pop("causes"))
+            last = count(step, state)
+            for event, number in events.items():
+                simulation.events[event].append(number)
+
+            reason = None
+            if termination is not None:
+                reason = termination.check(step, {category: c for category, c in last.items() if c > 0}, hash(state["code"].tobytes()))
+            if step % record == 0 or step == duration or reason is not None:
+                simulation.append(state)
+                simulation.steps.append(step)
+            if reason is not None:
+                simulation.termination = reason
+                break
+        completed = True
+    finally:
+        if counts is not None:
+            counts.close(simulation.termination if completed else "interrupted")
+
+    return simulation
+
+
+def PrecisionReport(cellautomaton0, types: list, seeds, duration: int = 100, params: dict = None) -> dict:
+    """Compare the float32 and float64 metabolite modes of the vectorized engine on the same seeds.
+    For each precision: frequencies of the pathways (classify_pathway) and mean +- sd of the numbers of deaths
+    and divisions per run. A summary table is printed.
+
+    Args:
+        cellautomaton0 (np.ndarray | dict): initial cellular automaton.
+        types (list): all the cell types.
+        seeds (list): seeds of the runs, the same for both precisions.
+        duration (int, optional): number of steps of each run. Default 100.
+        params (dict, optional): model parameters overriding DefaultParams. Default None.
+
+    Returns:
+        dict: {"float64": summary, "float32": summary}, a summary holds pathways, death, division and final counts per run.
+    """
+    report = {}
+    for dtype in (np.float64, np.float32):
+        runs = [SimulateCA_BC_fast(cellautomaton0, types, duration, seed=seed, params=params, dtype=dtype, record=duration)
+                for seed in seeds]
+        report[np.dtype(dtype).name] = {
+            "pathway": [classify_pathway(run.typescount) for run in runs],
+            "death": [sum(run.events["death"]) for run in runs],
+            "division": [sum(run.events["division"]) for run in runs],
+            "final": [{category: counts[-1] for category, counts in run.typescount.items()} for run in runs],
+        }
+
+    print(f"{'':12}{'float64':>22}{'float32':>22}")
+    for pathway in ("P1", "P2", "PX", None):
+        print(f"{str(pathway):12}" + "".join(f"{summary['pathway'].count(pathway) / len(seeds):>22.3f}" for summary in report.values()))
+    for event in ("death", "division"):
+        print(f"{event:12}" + "".join(f"{np.mean(summary[event]):>13.1f} +- {np.std(summary[event]):>5.1f}" for summary in report.values()))
+    return report
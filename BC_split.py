@@ -0,0 +1,136 @@
+
+# Rare-event sampling of pathway X by multilevel splitting.
+# Pathway X is reached when GH, AH and AGH cells each make up a share of the occupied cells (classify_pathway).
+# The progress of a trajectory towards it is the smallest of these three shares. Trajectories of the vectorized engine
+# are run until they cross the next progress level; those that cross it are cloned from their snapshot with fresh
+# random streams, the others are pruned. Each clone carries the weight of its parent divided by its number of copies,
+# so the weights of the trajectories reaching the last level sum to an unbiased estimate of the probability of PX.
+#   python BC_split.py --size 50 --duration 400 --trajectories 100 --levels 0.02 0.05 0.1 0.15 --a0 0.05
+
+import argparse
+import numpy as np
+from BC import cellcolors
+from BC_fast import StepBC_fast, DefaultParams, _tables
+from cellularautomata_BC import GenerateCA_BC, EncodeCA, _progress, errmsg
+
+TYPES = [category for category, *_ in cellcolors]
+LEVELS = (0.02, 0.05, 0.1, 0.15)  # The last one is the share of classify_pathway.
+
+
+def Progress(counts: np.ndarray, types: list = TYPES) -> float:
+    """Progress towards pathway X of a step: smallest share of GH, AH and AGH cells among the occupied cells.
+
+    Args:
+        counts (np.ndarray): number of cells of each type code.
+        types (list, optional): cell types of the codes. Default TYPES.
+    """
+    occupied = counts.sum() - counts[types.index("empty")]
+    if occupied == 0:
+        return 0.0
+    return min(counts[types.index(category)] for category in ("GH", "AH", "AGH")) / occupied
+
+
+def _advance(trajectory: dict, level: float, duration: int, params: dict, tables, types: list) -> bool:
+    """Run a trajectory until its progress reaches level (True), or until duration or extinction (False).
+    Extinction as in Termination: no tumor cell (neither normal nor empty) is left after there was one."""
+    tumor = [code for code, category in enumerate(types) if category not in ("empty", "normal")]
+    while Progress(trajectory["history"][-1], types) < level:
+        alive = trajectory["history"][-1][tumor].sum() > 0
+        trajectory["tumor"] = trajectory["tumor"] or alive
+        if trajectory["step"] >= duration or (trajectory["tumor"] and not alive):
+            return False
+        trajectory["state"], _ = StepBC_fast(trajectory["state"], params, trajectory["rng"], tables)
+        trajectory["step"] += 1
+        trajectory["history"].append(np.bincount(trajectory["state"]["code"].ravel(), minlength=len(types)))
+    return True
+
+
+def Splitting(cellautomaton0, levels=LEVELS, trajectories: int = 100, duration: int = 400, seed: int = 0,
+              params: dict = None, types: list = TYPES, complete: bool = True) -> dict:
+    """Probability of pathway X and weighted samples of it, by fixed-effort multilevel splitting.
+    At each level, the trajectories crossing it before duration are split into trajectories copies in total
+    (as evenly as possible), each copy continuing from the snapshot of its parent with its own random stream.
+
+    Args:
+        cellautomaton0 (np.ndarray | dict): initial cellular automaton, possibly encoded.
+        levels (tuple, optional): increasing progress levels, see Progress. Default LEVELS.
+        trajectories (int, optional): number of trajectories run at each level. Default 100.
+        duration (int, optional): number of steps of a run. Default 400.
+        seed (int, optional): seed of the random streams. Default 0.
+        params (dict, optional): model parameters overriding DefaultParams. Default None.
+        types (list, optional): all the cell types. Default TYPES.
+        complete (bool, optional): continue the trajectories reaching the last level up to duration. Default True.
+
+    Returns:
+        dict: probability (estimate of the probability of reaching the last level), stderr (its standard error
+            estimated as for a product of independent level fractions), fractions (fraction of the trajectories
+            crossing each level), steps (number of simulated steps, the cost) and samples, a list of
+            {weight, step (of the crossing of the last level), typescount {type: count per step}, state (last state)}.
+    """
+    assert all(a < b for a, b in zip(levels, levels[1:])), errmsg("Levels must increase", levels)
+    params = DefaultParams() | (params or {})
+    tables = _tables(types)
+    state = EncodeCA(cellautomaton0, types) if isinstance(cellautomaton0, np.ndarray) else dict(cellautomaton0)
+    start = np.bincount(state["code"].ravel(), minlength=len(types))
+    population = [{"state": state, "step": 0, "weight": 1 / trajectories, "history": [start], "tumor": False,
+                   "rng": np.random.default_rng([seed, 0, index])} for index in range(trajectories)]
+
+    fractions, steps = [], 0
+    for stage, level in enumerate(_progress(levels, colour="#e69138")):
+        crossed = []
+        for trajectory in population:
+            before = trajectory["step"]
+            if _advance(trajectory, level, duration, params, tables, types):
+                crossed.append(trajectory)
+            steps += trajectory["step"] - before
+        fractions.append(len(crossed) / len(population))
+        if not crossed or stage == len(levels) - 1:
+            population = crossed
+            break
+
+        # Split: parent i gets copies[i] clones, the extra copies going to random parents.
+        copies = np.full(len(crossed), trajectories // len(crossed))
+        extra = np.random.default_rng([seed, stage + 1]).choice(len(crossed), trajectories % len(crossed), replace=False)
+        copies[extra] += 1
+        population = []
+        for parent, number in zip(crossed, copies):
+            for _ in range(number):
+                population.append({"state": parent["state"], "step": parent["step"], "weight": parent["weight"] / number,
+                                   "history": list(parent["history"]), "tumor": parent["tumor"],
+                                   "rng": np.random.default_rng([seed, stage + 1, len(population)])})
+
+    samples = []
+    for trajectory in population:
+        step = trajectory["step"]
+        if complete:
+            before = trajectory["step"]
+            _advance(trajectory, np.inf, duration, params, tables, types)
+            steps += trajectory["step"] - before
+        history = np.array(trajectory["history"])
+        samples.append({"weight": trajectory["weight"], "step": step, "state": trajectory["state"],
+                        "typescount": {category: history[:, code].tolist() for code, category in enumerate(types)}})
+
+    probability = sum(sample["weight"] for sample in samples) if len(fractions) == len(levels) else 0.0
+    # Relative variance of a product of level fractions estimated from trajectories runs each.
+    relative = sum((1 - p) / (p * trajectories) for p in fractions if p > 0)
+    return {"probability": probability, "stderr": probability * np.sqrt(relative), "fractions": fractions,
+            "steps": steps, "samples": samples}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Probability and samples of pathway X by multilevel splitting.")
+    parser.add_argument("--size", type=int, default=50, help="grid size n (n x n grid)")
+    parser.add_argument("--duration", type=int, default=400, help="number of steps of a run")
+    parser.add_argument("--trajectories", type=int, default=100, help="trajectories per level")
+    parser.add_argument("--levels", type=float, nargs="+", default=list(LEVELS), help="progress levels")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random streams")
+    for name, value in DefaultParams().items():
+        parser.add_argument(f"--{name}", type=float, default=value, help=f"model parameter {name}")
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in DefaultParams()}
+    result = Splitting(GenerateCA_BC(args.size, cellcolors, dg=params["dg"], dc=params["dc"]), args.levels,
+                       args.trajectories, args.duration, args.seed, params)
+    print("fractions crossing each level:", [round(fraction, 3) for fraction in result["fractions"]])
+    print(f"P(PX) = {result['probability']:.3g} +- {result['stderr']:.2g}, {len(result['samples'])} samples, "
+          f"{result['steps']} simulated steps")
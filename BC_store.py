@@ -0,0 +1,128 @@
+
+# Consolidated store of the cell counts of many runs.
+# IngestCounts gathers count files (cellcounts/*.csv, CountWriter outputs) into one directory holding one .npy array
+# per column, all runs concatenated, and an index of the runs (a0, run, pathway, steps, offset).
+# CountStore reads it memory-mapped and answers filtered queries, e.g. CountStore("counts_store").runs(pathway="P2", a0=0.1).
+#   python BC_store.py cellcounts --output counts_store
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import numpy as np
+from cellularautomata_BC import ReadCounts, errmsg
+
+COLUMNS = ["Iteration", "empty", "normal", "H", "G", "GH", "A", "AH", "AG", "AGH"]
+INDEX = np.dtype([("a0", "f8"), ("run", "i4"), ("pathway", "U8"), ("steps", "i4"), ("offset", "i8"), ("source", "U128")])
+NAME = re.compile(r"^(?P<a0>\d*\.?\d+)_run(?P<run>\d+)_(?P<pathway>[A-Za-z0-9]+)")  # e.g. 0.05_run3_PX.csv
+
+
+def _describe(path: str) -> tuple[float, int, str]:
+    """a0, run number and pathway of a count file, from its CountWriter sidecar if any, otherwise from its name."""
+    if os.path.exists(path + ".json"):
+        with open(path + ".json") as file:
+            metadata = json.load(file)
+        params = metadata.get("params", {})
+        return float(params.get("a0", np.nan)), int(params.get("run", params.get("seed", -1))), str(metadata.get("pathway"))
+    match = NAME.match(os.path.basename(path))
+    assert match, errmsg("Unknown count file name", path)
+    return float(match["a0"]), int(match["run"]), match["pathway"]
+
+
+def IngestCounts(sources=("cellcounts",), output: str = "counts_store") -> int:
+    """Consolidate count files into a columnar store.
+
+    Args:
+        sources (tuple, optional): folders of count files (csv files or CountWriter column directories) or files. Default ("cellcounts",).
+        output (str, optional): directory of the store, replaced if it holds a store (or nothing). Default "counts_store".
+
+    Returns:
+        int: number of runs ingested.
+    """
+    paths = []
+    for source in sources:
+        if os.path.isdir(source) and not os.path.exists(source + ".json"):
+            paths += sorted(path for path in glob.glob(os.path.join(source, "*"))
+                            if (path.endswith(".csv") or os.path.isdir(path)) and not path.endswith(".json"))
+        else:
+            paths.append(source)
+
+    index = np.zeros(len(paths), dtype=INDEX)
+    columns = {column: [] for column in COLUMNS}
+    offset = 0
+    for i, path in enumerate(paths):
+        counts = ReadCounts(path)
+        steps = len(counts["Iteration"])
+        for column in COLUMNS:
+            columns[column].append(np.asarray(counts[column], dtype=np.int32) if column in counts else np.zeros(steps, np.int32))
+        a0, run, pathway = _describe(path)
+        index[i] = (a0, run, pathway, steps, offset, os.path.basename(path))
+        offset += steps
+
+    if os.path.isdir(output):  # No file of a previous, larger store may remain.
+        assert not os.listdir(output) or os.path.exists(os.path.join(output, "meta.json")), errmsg("Not a count store", output)
+        shutil.rmtree(output)
+    os.makedirs(output)
+    for column, values in columns.items():
+        np.save(os.path.join(output, column + ".npy"), np.concatenate(values) if values else np.zeros(0, np.int32))
+    np.save(os.path.join(output, "index.npy"), index)
+    with open(os.path.join(output, "meta.json"), "w") as file:
+        json.dump({"columns": COLUMNS, "runs": len(paths), "sources": list(sources)}, file, indent=1)
+    return len(paths)
+
+
+class CountStore:
+    """Memory-mapped reader of a store written by IngestCounts.
+
+    Args:
+        path (str): directory of the store.
+
+    Attributes:
+        index (np.ndarray): one record per run with fields a0, run, pathway, steps, offset and source.
+    """
+
+    def __init__(self, path: str = "counts_store"):
+        self.path = path
+        self.index = np.load(os.path.join(path, "index.npy"))
+        self._columns = {}
+
+    def column(self, name: str) -> np.ndarray:  # Column of all the runs, memory-mapped.
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def query(self, a0: float = None, run: int = None, pathway: str = None, minsteps: int = None) -> np.ndarray:
+        """Positions in the index of the runs matching all the given filters."""
+        keep = np.ones(len(self.index), dtype=bool)
+        if a0 is not None:
+            keep &= np.isclose(self.index["a0"], a0)
+        if run is not None:
+            keep &= self.index["run"] == run
+        if pathway is not None:
+            keep &= self.index["pathway"] == pathway
+        if minsteps is not None:
+            keep &= self.index["steps"] >= minsteps
+        return np.flatnonzero(keep)
+
+    def run(self, position: int, columns: list = None) -> dict[str, np.ndarray]:
+        """Counts of one run, {column: values per step}, as views on the memory-mapped columns."""
+        record = self.index[position]
+        window = slice(record["offset"], record["offset"] + record["steps"])
+        return {name: self.column(name)[window] for name in (columns or COLUMNS)}
+
+    def runs(self, columns: list = None, **filters) -> list[dict[str, np.ndarray]]:
+        """Counts of the runs matching the filters of query, e.g. runs(pathway="P2", a0=0.1)."""
+        return [self.run(position, columns) for position in self.query(**filters)]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consolidate cell count files into a columnar store.")
+    parser.add_argument("sources", nargs="*", default=["cellcounts"], help="folders or files of counts")
+    parser.add_argument("--output", default="counts_store", help="directory of the store")
+    args = parser.parse_args()
+    print(IngestCounts(args.sources, args.output), "runs saved to", args.output)
@@ -0,0 +1,427 @@
+
+# Parameter sweeps of the BC model.
+# Points of the joint space of the model parameters are drawn from a space-filling design (Latin hypercube or Sobol),
+# run by local worker processes and summarized in an SQLite database: pathway, first step with an invasive cell,
+# final composition and wall time. Runs already in the database are skipped, so an interrupted sweep is resumed
+# by running the same command again. The adaptive mode (Boundary) bisects along each axis where the pathway changes.
+#   python BC_sweep.py --points 1024 --axes a0 pa k hN hT --design sobol --replicates 2 --database sweep.sqlite
+#   python BC_sweep.py --adaptive --axes a0 --pathway PX --level 0.2 --replicates 10 --tolerance 0.01
+#   python BC_sweep.py --points 64 --axes a0 --width 0.3 --replicates 4 --max-replicates 40  (sequential replicates)
+
+import argparse
+import hashlib
+import json
+import random
+import sqlite3
+import warnings
+from datetime import datetime
+from multiprocessing import get_context
+from time import perf_counter
+
+import numpy as np
+from scipy import stats
+from scipy.stats import qmc
+import cellularautomata_BC
+from BC import BC, SetParams, cellcolors
+from BC_utils import classify_pathway
+from BC_fast import SimulateCA_BC_fast, DefaultParams
+from cellularautomata_BC import GenerateCA_BC, SimulateCA_BC, Termination, TypesCount, errmsg
+
+TYPES = [category for category, *_ in cellcolors]
+INVASIVE = ("GH", "AH", "AGH")  # Invasive phenotypes: hyperplastic cells with a glycolytic or acid-resistant trait.
+SPACE = {  # Parameter: (low, high, log scale).
+    "a0": (0.025, 0.2, False),
+    "pa": (1e-4, 1e-2, True),
+    "k": (5.0, 20.0, False),
+    "hN": (4.65e2, 1.86e3, True),
+    "hT": (4.3e3, 1.72e4, True),
+    "dg": (65.0, 260.0, True),
+    "dc": (2.5, 10.0, True),
+}
+COLUMNS = {  # Columns of the runs table besides the parameters.
+    "id": "TEXT PRIMARY KEY", "point": "INTEGER", "replicate": "INTEGER", "seed": "INTEGER",
+    "n": "INTEGER", "duration": "INTEGER", "engine": "TEXT",
+    "pathway": "TEXT", "first_invasive": "INTEGER", "final": "TEXT", "steps": "INTEGER",
+    "termination": "TEXT", "seconds": "REAL", "date": "TEXT",
+}
+
+
+def Design(points: int, axes=tuple(SPACE), method: str = "lhs", seed: int = 0, space: dict = SPACE) -> list[dict]:
+    """Space-filling design over some axes of the parameter space, the other parameters keep their default values.
+    The design only depends on its arguments, so a sweep is resumed by drawing it again.
+
+    Args:
+        points (int): number of points. Sobol designs are balanced for powers of 2.
+        axes (tuple, optional): parameters varied. Default all the parameters of SPACE.
+        method (str, optional): "lhs" (Latin hypercube) or "sobol" (scrambled Sobol sequence). Default "lhs".
+        seed (int, optional): seed of the design. Default 0.
+        space (dict, optional): {parameter: (low, high, log scale)}. Default SPACE.
+
+    Returns:
+        list[dict]: parameters of every point, {a0, pa, k, hN, hT, dg, dc}.
+    """
+    assert all(axis in space for axis in axes), errmsg("Unknown parameter in", axes)
+    assert method in ("lhs", "sobol"), errmsg("Unknown design", method)
+    if method == "lhs":
+        unit = qmc.LatinHypercube(d=len(axes), seed=seed).random(points)
+    else:
+        with warnings.catch_warnings():  # balance warning of scipy when points is not a power of 2
+            warnings.simplefilter("ignore", UserWarning)
+            unit = qmc.Sobol(d=len(axes), scramble=True, seed=seed).random(points)
+
+    low = np.array([np.log(space[axis][0]) if space[axis][2] else space[axis][0] for axis in axes])
+    high = np.array([np.log(space[axis][1]) if space[axis][2] else space[axis][1] for axis in axes])
+    scaled = qmc.scale(unit, low, high) if axes else np.zeros((points, 0))
+    defaults = DefaultParams()
+    design = []
+    for row in scaled:
+        params = dict(defaults)
+        for axis, value in zip(axes, row):
+            params[axis] = float(np.exp(value) if space[axis][2] else value)
+        design.append(params)
+    return design
+
+
+def RunId(params: dict, seed: int, n: int, duration: int, engine: str) -> str:
+    """Key of a run in the database: hash of its parameters (12 significant digits), seed, grid size, duration and engine."""
+    key = json.dumps([{name: float(f"{value:.12g}") for name, value in sorted(params.items())}, seed, n, duration, engine])
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def OpenResults(path: str = "sweep.sqlite") -> sqlite3.Connection:
+    """Open (or create) the results database, with one row per run in the table runs."""
+    connection = sqlite3.connect(path)
+    columns = [f"{name} {kind}" for name, kind in COLUMNS.items()] + [f"{name} REAL" for name in SPACE]
+    connection.execute(f"CREATE TABLE IF NOT EXISTS runs ({', '.join(columns)})")
+    connection.execute("CREATE INDEX IF NOT EXISTS runs_pathway ON runs (pathway)")
+    connection.commit()
+    return connection
+
+
+def Results(path: str = "sweep.sqlite", where: str = "", args: tuple = ()) -> list[dict]:
+    """Rows of the runs table as dicts, final decoded, e.g. Results("sweep.sqlite", "pathway = ? AND a0 < ?", ("PX", 0.1))."""
+    with OpenResults(path) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute("SELECT * FROM runs" + (f" WHERE {where}" if where else ""), args).fetchall()
+    return [dict(row) | {"final": json.loads(row["final"])} for row in rows]
+
+
+def Runs(tasks: list[dict], database: str = "sweep.sqlite") -> dict[str, dict]:
+    """Completed runs of the tasks, {id: row as in Results}, read by batches of ids."""
+    rows = {}
+    with OpenResults(database) as connection:
+        connection.row_factory = sqlite3.Row
+        for first in range(0, len(tasks), 500):  # below the limit of SQL variables
+            ids = [task["id"] for task in tasks[first:first + 500]]
+            for row in connection.execute(f"SELECT * FROM runs WHERE id IN ({', '.join('?' * len(ids))})", ids):
+                rows[row["id"]] = dict(row) | {"final": json.loads(row["final"])}
+    return rows
+
+
+def _quiet():  # Initializer of the worker processes: no progress bars.
+    cellularautomata_BC._PROGRESS = False
+
+
+def RunPoint(task: dict) -> dict:
+    """Run one point of a sweep and summarize it. Runs in the worker processes.
+
+    Args:
+        task (dict): id, params, seed, n, duration and engine ("fast" for SimulateCA_BC_fast, "fast-crn" for
+            SimulateCA_BC_fast with common random numbers, "reference" for SimulateCA_BC with the rule BC), and the
+            extinction flag of the termination.
+
+    Returns:
+        dict: the task with pathway (classify_pathway), first_invasive (first step with an invasive cell, see INVASIVE,
+            None if there was none), final ({type: count} of the last step), steps, termination and seconds.
+    """
+    params, n = task["params"], task["n"]
+    start = perf_counter()
+    cellautomaton0 = GenerateCA_BC(n, None, dg=params["dg"], dc=params["dc"])
+    termination = Termination(extinction=task.get("extinction", True))
+    if task["engine"] in ("fast", "fast-crn"):
+        simulation = SimulateCA_BC_fast(cellautomaton0, TYPES, task["duration"], seed=task["seed"], params=params,
+                                        termination=termination, record=task["duration"], crn=task["engine"] == "fast-crn")
+        typescount = simulation.typescount
+    else:
+        SetParams(**params)
+        random.seed(task["seed"])
+        simulation = SimulateCA_BC(cellautomaton0, BC, duration=task["duration"], termination=termination)
+        typescount = TypesCount(simulation, TYPES)
+    seconds = perf_counter() - start
+
+    invasive = [sum(typescount[category][step] for category in INVASIVE)
+                for step in range(len(typescount["empty"]))]
+    return task | {
+        "pathway": classify_pathway(typescount),
+        "first_invasive": next((step for step, count in enumerate(invasive) if count > 0), None),
+        "final": {category: typescount[category][-1] for category in TYPES},
+        "steps": len(typescount["empty"]) - 1,
+        "termination": simulation.termination,
+        "seconds": seconds,
+    }
+
+
+def Tasks(design: list[dict], replicates: int = 1, n: int = 50, duration: int = 400, engine: str = "fast",
+          seed: int = 0) -> list[dict]:
+    """Runs of a design, replicate r of every point using the random seed seed + r. With the engine "fast-crn" the
+    replicates r of all the points share their random numbers (common random numbers), see Compare."""
+    assert engine in ("fast", "fast-crn", "reference"), errmsg("Unknown engine", engine)
+    return [{"id": RunId(params, seed + replicate, n, duration, engine), "point": point, "replicate": replicate,
+             "seed": seed + replicate, "params": params, "n": n, "duration": duration, "engine": engine}
+            for point, params in enumerate(design) for replicate in range(replicates)]
+
+
+def Sweep(tasks: list[dict], database: str = "sweep.sqlite", workers: int = None, extinction: bool = True) -> int:
+    """Run the tasks missing from the database in worker processes. The main process alone writes the results,
+    each one committed when it arrives so that an interrupted sweep loses no finished run.
+
+    Args:
+        tasks (list[dict]): runs, see Tasks.
+        database (str, optional): SQLite results database. Default "sweep.sqlite".
+        workers (int, optional): number of worker processes. Default None = number of cores.
+        extinction (bool, optional): stop the runs when the tumor died out (see Termination). Default True.
+
+    Returns:
+        int: number of runs done by this call.
+    """
+    connection = OpenResults(database)
+    done = {row[0] for row in connection.execute("SELECT id FROM runs")}
+    todo = [task | {"extinction": extinction} for task in tasks if task["id"] not in done]
+    print(f"{len(tasks) - len(todo)} of {len(tasks)} runs already in {database}, {len(todo)} to do")
+
+    names = list(COLUMNS) + list(SPACE)
+    insert = f"INSERT OR REPLACE INTO runs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+    count = 0
+    try:
+        with get_context("spawn").Pool(workers, initializer=_quiet) as pool:
+            for result in pool.imap_unordered(RunPoint, todo):
+                row = result | result["params"] | {"final": json.dumps(result["final"]),
+                                                   "date": datetime.now().isoformat(timespec="seconds")}
+                connection.execute(insert, [row[name] for name in names])
+                connection.commit()
+                count += 1
+                print(f"{count}/{len(todo)} point {result['point']} replicate {result['replicate']}: "
+                      f"{result['pathway']} in {result['seconds']:.1f} s")
+    finally:
+        connection.close()
+    return count
+
+
+def Invasive(row: dict) -> float:
+    """Number of invasive cells (see INVASIVE) at the end of a run, a statistic of Compare."""
+    return sum(row["final"].get(category, 0) for category in INVASIVE)
+
+
+def Compare(params: dict, change: dict, statistic=Invasive, replicates: int = 10, n: int = 50, duration: int = 400,
+            engine: str = "fast-crn", seed: int = 0, database: str = "sweep.sqlite", workers: int = None) -> dict:
+    """Effect of a parameter change on a statistic of the runs, estimated from paired replicates: replicate r of both
+    points uses the seed seed + r, hence the same random numbers with the engine "fast-crn", and the variance of the
+    paired differences is much lower than that of the difference of two independent means.
+
+    Args:
+        params (dict): parameters of the first point, completed by DefaultParams(), e.g. {"a0": 0.05}.
+        change (dict): parameters changed in the second point, e.g. {"a0": 0.1}.
+        statistic (fun, optional): statistic of a run, statistic(row of Results) -> float. Default Invasive.
+        replicates (int, optional): number of pairs. Default 10.
+        n, duration, engine, seed: runs of both points, see Tasks. Default engine "fast-crn".
+        database (str, optional): SQLite results database. Default "sweep.sqlite".
+        workers (int, optional): number of worker processes. Default None = number of cores.
+
+    Returns:
+        dict: difference (mean of second - first), stderr (standard error of the paired differences), unpaired_stderr
+            (standard error of the difference of the means, as with independent runs) and the pairs of statistics.
+    """
+    assert replicates >= 2
+    first = DefaultParams() | params
+    tasks = Tasks([first, first | change], replicates, n, duration, engine, seed)
+    Sweep(tasks, database, workers)
+    rows = Runs(tasks, database)
+    values = np.array([[statistic(rows[task["id"]]) for task in tasks if task["point"] == point] for point in (0, 1)])
+    differences = values[1] - values[0]
+    return {
+        "difference": float(differences.mean()),
+        "stderr": float(differences.std(ddof=1) / np.sqrt(replicates)),
+        "unpaired_stderr": float(np.sqrt((values[0].var(ddof=1) + values[1].var(ddof=1)) / replicates)),
+        "pairs": values.T.tolist(),
+    }
+
+
+def Pathways(tasks: list[dict], database: str = "sweep.sqlite") -> dict[int, dict]:
+    """Pathway frequencies of every point of the tasks, from its replicates completed in the database.
+
+    Returns:
+        dict[int, dict]: {point: {pathway: fraction of the replicates}}, pathway None for runs without GH or AH cells.
+    """
+    rows = Runs(tasks, database)
+    runs = {}
+    for task in tasks:
+        if task["id"] in rows:
+            runs.setdefault(task["point"], []).append(rows[task["id"]]["pathway"])
+    return {point: {label: pathways.count(label) / len(pathways) for label in set(pathways)} for point, pathways in runs.items()}
+
+
+def Boundary(axis: str, pathway: str = None, level: float = 0.5, base: dict = None, tolerance: float = 0.02,
+             start: int = 5, maxpoints: int = 40, replicates: int = 8, n: int = 50, duration: int = 400,
+             engine: str = "fast", seed: int = 0, database: str = "sweep.sqlite", workers: int = None,
+             space: dict = SPACE) -> dict:
+    """Locate the pathway phase boundaries along one axis by bisection, the other parameters being fixed.
+    Points start evenly spaced on the axis (log scale for log axes). Each point is classified from the pathway frequencies
+    of its replicates: by its most frequent pathway, or, if pathway is given, as pathway when its frequency reaches level
+    and "other" otherwise (e.g. pathway="PX", level=0.2 for a minority pathway). Every interval between neighboring
+    points of different classes is bisected, until all of them are narrower than tolerance. The runs are stored in the
+    database like those of Sweep, so that an interrupted refinement resumes where it stopped.
+
+    Args:
+        axis (str): parameter varied, a key of space.
+        pathway (str, optional): pathway whose region is delimited. Default None = all the pathways.
+        level (float, optional): frequency from which a point is classified as pathway. Default 0.5.
+        base (dict, optional): values of the other parameters. Default None = DefaultParams().
+        tolerance (float, optional): width of the final intervals, as a fraction of the axis range (of its log range
+            for log axes). Default 0.02.
+        start (int, optional): number of initial points. Default 5.
+        maxpoints (int, optional): maximal number of points. Default 40.
+        replicates (int, optional): runs of every point. Default 8.
+        n, duration, engine, seed: runs of every point, see Tasks.
+        database (str, optional): SQLite results database. Default "sweep.sqlite".
+        workers (int, optional): number of worker processes. Default None = number of cores.
+        space (dict, optional): {parameter: (low, high, log scale)}. Default SPACE.
+
+    Returns:
+        dict: axis, points (list of (value, {pathway: fraction}, class) sorted by value), boundaries (list of
+            (low, high, class below, class above)) and runs (number of runs of the refinement).
+    """
+    assert axis in space, errmsg("Unknown parameter", axis)
+    assert start >= 2
+    low, high, log = space[axis]
+    scale = (np.log, np.exp) if log else (lambda x: x, lambda x: x)
+    base = DefaultParams() | (base or {})
+
+    def classify(frequencies: dict) -> str:
+        if pathway is not None:
+            return pathway if frequencies.get(pathway, 0) >= level else "other"
+        return max(sorted(frequencies, key=str), key=frequencies.get)  # ties broken by name, None runs count as a pathway
+
+    coordinates = list(np.linspace(scale[0](low), scale[0](high), start))  # On the (log) axis.
+    width = tolerance * (scale[0](high) - scale[0](low))
+    while True:
+        tasks = Tasks([base | {axis: float(scale[1](u))} for u in coordinates], replicates, n, duration, engine, seed)
+        Sweep(tasks, database, workers)
+        frequencies = Pathways(tasks, database)
+        ordered = sorted(range(len(coordinates)), key=coordinates.__getitem__)
+        classes = {point: classify(frequencies[point]) for point in ordered}
+        split = [(a, b) for a, b in zip(ordered, ordered[1:])
+                 if classes[a] != classes[b] and coordinates[b] - coordinates[a] > width]
+        if not split or len(coordinates) >= maxpoints:
+            break
+        coordinates += [(coordinates[a] + coordinates[b]) / 2 for a, b in split][:maxpoints - len(coordinates)]
+
+    points = [(float(scale[1](coordinates[point])), frequencies[point], classes[point]) for point in ordered]
+    boundaries = [(a[0], b[0], a[2], b[2]) for a, b in zip(points, points[1:]) if a[2] != b[2]]
+    for lower, upper, below, above in boundaries:
+        print(f"{axis}: {below} -> {above} between {lower:.6g} and {upper:.6g}")
+    return {"axis": axis, "points": points, "boundaries": boundaries, "runs": len(coordinates) * replicates}
+
+
+def Sequential(design: list[dict], width: float = 0.2, statistic=None, confidence: float = 0.95, minimum: int = 4,
+               maximum: int = 40, batch: int = 2, n: int = 50, duration: int = 400, engine: str = "fast", seed: int = 0,
+               database: str = "sweep.sqlite", workers: int = None) -> list[dict]:
+    """Run replicates of every point of a design until its confidence interval is narrower than width.
+    Replicates are added by batches to the points which are not settled yet, so that the runs go to the uncertain
+    points: a point is settled when it has at least minimum replicates and its interval is narrow enough, or when
+    it reaches maximum replicates. Without statistic the interval is the Wilson score interval of the frequency of
+    each pathway (the widest one counts); with a statistic it is the normal interval of its mean.
+
+    Args:
+        design (list[dict]): parameters of the points, see Design.
+        width (float, optional): target width of the confidence intervals. Default 0.2.
+        statistic (fun, optional): statistic of a run, statistic(row of Results) -> float or None (ignored),
+            e.g. Invasive. Default None = pathway frequencies.
+        confidence (float, optional): confidence level of the intervals. Default 0.95.
+        minimum (int, optional): minimal number of replicates of a point. Default 4.
+        maximum (int, optional): maximal number of replicates of a point. Default 40.
+        batch (int, optional): replicates added to each unsettled point per round. Default 2.
+        n, duration, engine, seed: runs of every point, see Tasks.
+        database (str, optional): SQLite results database. Default "sweep.sqlite".
+        workers (int, optional): number of worker processes. Default None = number of cores.
+
+    Returns:
+        list[dict]: for every point, params, replicates, width (of its interval), settled (bool) and either
+            pathways ({pathway: frequency}) or mean (of the statistic).
+    """
+    assert 0 < minimum <= maximum and batch > 0
+    z = stats.norm.ppf(0.5 + confidence / 2)
+
+    def summary(rows: list[dict]) -> dict:
+        if statistic is None:
+            labels = [row["pathway"] for row in rows]
+            r = len(labels)
+            halfwidth = [z * np.sqrt(p * (1 - p) / r + z**2 / (4 * r**2)) / (1 + z**2 / r)  # Wilson score interval
+                         for p in (labels.count(label) / r for label in set(labels))]
+            return {"pathways": {label: labels.count(label) / r for label in set(labels)}, "width": 2 * max(halfwidth)}
+        values = np.array([value for value in map(statistic, rows) if value is not None], dtype=float)
+        if len(values) < 2:
+            return {"mean": float(values.mean()) if len(values) else None, "width": np.inf}
+        return {"mean": float(values.mean()), "width": float(2 * z * values.std(ddof=1) / np.sqrt(len(values)))}
+
+    replicates = [minimum] * len(design)
+    while True:
+        tasks = [task | {"point": point} for point, params in enumerate(design)
+                 for task in Tasks([params], replicates[point], n, duration, engine, seed)]
+        Sweep(tasks, database, workers)
+        rows = Runs(tasks, database)
+        points = []
+        for point, params in enumerate(design):
+            result = summary([rows[task["id"]] for task in tasks if task["point"] == point])
+            settled = result["width"] <= width or replicates[point] >= maximum
+            points.append({"params": params, "replicates": replicates[point], "settled": settled} | result)
+        unsettled = [point for point, result in enumerate(points) if not result["settled"]]
+        print(f"{len(design) - len(unsettled)} of {len(design)} points settled, {len(tasks)} runs")
+        if not unsettled:
+            return points
+        for point in unsettled:
+            replicates[point] = min(replicates[point] + batch, maximum)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Space-filling parameter sweep of the BC model, resumable.")
+    parser.add_argument("--points", type=int, default=256, help="number of parameter points")
+    parser.add_argument("--axes", nargs="+", default=list(SPACE), choices=list(SPACE), help="parameters varied")
+    parser.add_argument("--design", default="lhs", choices=["lhs", "sobol"], help="space-filling design")
+    parser.add_argument("--replicates", type=int, default=1, help="runs of every point")
+    parser.add_argument("--size", type=int, default=50, help="grid size n (n x n grid)")
+    parser.add_argument("--duration", type=int, default=400, help="maximal number of steps of a run")
+    parser.add_argument("--engine", default="fast", choices=["fast", "fast-crn", "reference"],
+                        help="simulation engine, fast-crn = fast with common random numbers across the points")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the design and first seed of the runs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--database", default="sweep.sqlite", help="SQLite results database")
+    parser.add_argument("--adaptive", action="store_true", help="locate the pathway boundaries along each axis instead")
+    parser.add_argument("--pathway", default=None, help="adaptive mode: pathway whose region is delimited")
+    parser.add_argument("--level", type=float, default=0.5, help="adaptive mode: frequency from which a point is of the pathway")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="adaptive mode: boundary width, fraction of the axis range")
+    parser.add_argument("--width", type=float, default=None,
+                        help="sequential mode: replicates until the confidence interval of the pathway frequencies "
+                             "(or of --statistic) is narrower than width, --replicates being the minimum")
+    parser.add_argument("--statistic", default=None, help="sequential mode: a cell type (final count), first_invasive or seconds")
+    parser.add_argument("--max-replicates", type=int, default=40, help="sequential mode: maximal replicates of a point")
+    args = parser.parse_args()
+
+    if args.width is not None:
+        if args.statistic is None:
+            statistic = None
+        elif args.statistic in TYPES:
+            statistic = lambda row: row["final"][args.statistic]
+        else:
+            statistic = lambda row: row[args.statistic]
+        design = Design(args.points, args.axes, args.design, args.seed)
+        Sequential(design, args.width, statistic, minimum=args.replicates, maximum=args.max_replicates, n=args.size,
+                   duration=args.duration, engine=args.engine, seed=args.seed, database=args.database, workers=args.workers)
+    elif args.adaptive:
+        for axis in args.axes:
+            Boundary(axis, args.pathway, args.level, tolerance=args.tolerance, maxpoints=args.points,
+                     replicates=args.replicates, n=args.size, duration=args.duration, engine=args.engine,
+                     seed=args.seed, database=args.database, workers=args.workers)
+    else:
+        design = Design(args.points, args.axes, args.design, args.seed)
+        tasks = Tasks(design, args.replicates, args.size, args.duration, args.engine, args.seed)
+        Sweep(tasks, args.database, args.workers)
@@ -0,0 +1,134 @@
+
+# Validation of the fast engines of the BC model against the reference engine (SimulateCA_BC + BC).
+# The engines draw their random numbers in different orders, so trajectories are compared in distribution over many
+# seeds with two-sample tests. The deterministic part, the metabolite fields, must agree exactly.
+
+import random
+import numpy as np
+from scipy import stats
+from BC import BC, cellcolors
+from BC_utils import UpdateMetabolites, classify_pathway
+from BC_fast import SimulateCA_BC_fast, StepBC_fast, DefaultParams
+from cellularautomata_BC import SimulateCA_BC, Profiler, CountTypes, EncodeCA, Moore
+
+TYPES = [category for category, *_ in cellcolors]
+
+
+def RunReference(cellautomaton0: np.ndarray, seed, duration: int = 100, f=BC, types: list = TYPES) -> dict:
+    """Run the reference engine and collect the statistics compared by Equivalence.
+
+    Returns:
+        dict: typescount {type: count per step}, death and division (totals of the run), and trace.
+    """
+    random.seed(seed)
+    profile = Profiler()
+    simulation = SimulateCA_BC(cellautomaton0, f, duration=duration, profile=profile)
+    counts = [CountTypes(ca) for ca in simulation]
+    return {
+        "typescount": {category: [count.get(category, 0) for count in counts] for category in types},
+        "death": profile.branches["death by acid"] + profile.branches["death by ATP"],
+        "division": profile.branches["division"],
+        "trace": simulation,
+    }
+
+
+def RunFast(cellautomaton0: np.ndarray, seed, duration: int = 100, types: list = TYPES, dtype=np.float64) -> dict:
+    """Run the vectorized engine of BC_fast and collect the statistics compared by Equivalence, see RunReference."""
+    simulation = SimulateCA_BC_fast(cellautomaton0, types, duration, seed=seed, dtype=dtype, record=duration)
+    return {
+        "typescount": simulation.typescount,
+        "death": sum(simulation.events["death"]),
+        "division": sum(simulation.events["division"]),
+        "trace": simulation,
+    }
+
+
+def CheckFields(simulation: list, types: list = TYPES) -> dict:
+    """Exact agreement of the metabolite update of the vectorized engine with UpdateMetabolites.
+    Every automaton of a reference trace is updated by both, the basement membrane being clamped in both.
+
+    Args:
+        simulation (list): trace of the reference engine.
+        types (list, optional): cell types. Default TYPES.
+
+    Returns:
+        dict: exact (bool) and maxerror {field: maximal absolute difference}.
+    """
+    maxerror = {"glucose": 0.0, "oxygen": 0.0, "acid": 0.0}
+    rng = np.random.default_rng(0)
+    for cellautomaton in simulation:
+        n, m = cellautomaton.shape[:2]
+        fast, _ = StepBC_fast(EncodeCA(cellautomaton, types), DefaultParams(), rng)
+
+        padded = np.empty((n + 2, m + 2), dtype=object)
+        padded[1:-1, 1:-1] = [[(cell[0], cell[1]) for cell in row] for row in cellautomaton]
+        padded[0, 1:-1], padded[-1, 1:-1] = padded[1, 1:-1], padded[-2, 1:-1]
+        padded[:, 0], padded[:, -1] = padded[:, 1], padded[:, -2]
+        padded[0, 0] = padded[0, -1] = padded[-1, 0] = padded[-1, -1] = ("empty", (0.0, 0.0, 0.0, (None, None)))
+        for i in range(n - 1):  # the basement membrane is clamped by both engines
+            for j in range(m):
+                neighbors = [padded[i + 1 + di, j + 1 + dj] for di, dj in Moore(1)]
+                levels = UpdateMetabolites(cellautomaton[i, j, 0], neighbors)
+                for key, level in zip(maxerror, levels):
+                    maxerror[key] = max(maxerror[key], abs(float(fast[key][i, j]) - level))
+    return {"exact": all(error == 0 for error in maxerror.values()), "maxerror": maxerror}
+
+
+def Equivalence(cellautomaton0: np.ndarray, seeds, duration: int = 100, candidate=RunFast, alpha: float = 0.01,
+                times: list = None) -> dict:
+    """Statistical equivalence of a candidate engine with the reference engine, both run on the same seeds.
+
+    Tests (Bonferroni corrected at level alpha):
+      - Kolmogorov-Smirnov two-sample test on the count of each type at the given times,
+      - chi-square test of homogeneity of the pathway frequencies (classify_pathway),
+      - Kolmogorov-Smirnov two-sample test on the death and division rates per occupied cell and step.
+    The metabolite fields of the reference trajectories are checked exactly with CheckFields.
+
+    Args:
+        cellautomaton0 (np.ndarray): initial cellular automaton.
+        seeds (list): seeds of the runs.
+        duration (int, optional): number of steps. Default 100.
+        candidate (fun, optional): engine, candidate(cellautomaton0, seed, duration) -> dict as RunReference. Default RunFast.
+        alpha (float, optional): family-wise significance level. Default 0.01.
+        times (list, optional): steps at which the counts are compared. Default None = quarters of the duration.
+
+    Returns:
+        dict: tests {name: (statistic, p-value)}, rejected (names of the failed tests), fields (see CheckFields) and equivalent (bool).
+    """
+    times = times or [duration // 4, duration // 2, 3 * duration // 4, duration]
+    runs = {"reference": [], "candidate": []}
+    for seed in seeds:
+        runs["reference"].append(RunReference(cellautomaton0, seed, duration))
+        runs["candidate"].append(candidate(cellautomaton0, seed, duration))
+
+    def occupied(run: dict) -> int:  # Number of occupied cell-steps.
+        return sum(sum(counts) for category, counts in run["typescount"].items() if category != "empty")
+
+    tests = {}
+    for category in TYPES:
+        for t in times:
+            samples = [[run["typescount"][category][t] for run in runs[engine]] for engine in runs]
+            if samples[0] != samples[1]:
+                tests[f"{category} at {t}"] = tuple(stats.ks_2samp(*samples))
+
+    pathways = [[classify_pathway(run["typescount"]) for run in runs[engine]] for engine in runs]
+    table = np.array([[labels.count(pathway) for pathway in ("P1", "P2", "PX", None)] for labels in pathways])
+    table = table[:, table.sum(0) > 0]
+    if table.shape[1] > 1:
+        chi2, pvalue, *_ = stats.chi2_contingency(table)
+        tests["pathways"] = (chi2, pvalue)
+
+    for event in ("death", "division"):
+        samples = [[run[event] / max(occupied(run), 1) for run in runs[engine]] for engine in runs]
+        tests[f"{event} rate"] = tuple(stats.ks_2samp(*samples))
+
+    threshold = alpha / max(len(tests), 1)
+    rejected = [name for name, (_, pvalue) in tests.items() if pvalue < threshold]
+    fields = CheckFields(runs["reference"][0]["trace"])
+
+    print(f"{'test':24}{'statistic':>12}{'p-value':>12}")
+    for name, (statistic, pvalue) in tests.items():
+        print(f"{name:24}{statistic:>12.4f}{pvalue:>12.4f}{'  REJECTED' if name in rejected else ''}")
+    print("pathways (P1, P2, PX, None):", [[labels.count(pathway) for pathway in ("P1", "P2", "PX", None)] for labels in pathways])
+    print("metabolite fields:", "exact" if fields["exact"] else f"differ {fields['maxerror']}")
+    return {"tests": tests, "rejected": rejected, "fields": fields, "equivalent": not rejected and fields["exact"]}
@@ -3,19 +3,44 @@
 # * MASTER TUTORIAL
 # * Paris Saclay University
 
-import matplotlib as mpl
-import matplotlib.pyplot as plt
+# Simulation core: generation, stepping, counts and I/O. It does not depend on any plotting library, the GUI and the
+# viewer are in cellularautomata_gui, loaded on first use of one of its names (e.g. from cellularautomata_BC import GuiCA).
+
 from random import choices
 import numpy as np  # type: ignore
-from matplotlib.animation import FuncAnimation, PillowWriter  # type: ignore
-import matplotlib.colors as color  # type: ignore
-import seaborn as sns  # type: ignore
-from matplotlib.widgets import Slider, Button, CheckButtons, RadioButtons, RectangleSelector  # type: ignore
-from matplotlib.patches import Rectangle  # type: ignore
-from tqdm import tqdm
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from datetime import datetime
+import random
+import json
+import io
+import os
+import sys
 import csv
+from multiprocessing import Pool, Process, Queue, Event, shared_memory
+from queue import Empty
+import shutil
+import subprocess
+
+_GUI = ("DrawCA", "Switch", "Envelope", "SaveCounts", "ShowSimulation", "Weights", "GuiCA")  # Names of cellularautomata_gui.
+
+
+def __getattr__(name: str):  # Lazy access to the GUI layer.
+    if name in _GUI:
+        import cellularautomata_gui
+        return getattr(cellularautomata_gui, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-mpl.use('TkAgg')  # set Tkinter as Matplotlib backend
+
+_PROGRESS = True  # Show the progress bars of the simulations, disabled in the worker processes of sweeps.
+
+
+def _progress(iterable, colour: str = '#3c78d8'):  # Progress bar of the simulations, tqdm is loaded on first use.
+    if not _PROGRESS:
+        return iterable
+    from tqdm import tqdm
+    return tqdm(iterable, desc="CA Step", ascii=False, bar_format="{l_bar}{bar:65} {r_bar}", colour=colour)
 
 def errmsg(content,arg=""):
     print("** CA ERROR>> ",content,": " if arg !="" else "",arg)
@@ -33,6 +58,39 @@ def CountType(cells: list, category: str) -> int:
     return [category for category, *_ in cells].count(category)
 
 
+def CountTypes(cellautomaton: np.ndarray) -> dict[str, int]:
+    """Return the number of cells of each type present in a cellular automaton.
+
+    Args:
+        cellautomaton (np.ndarray | ChunkedCA | dict): cellular automaton, possibly chunked or encoded (see EncodeCA).
+
+    Returns:
+        dict[str, int]: {type: number of cells}, types absent from the automaton are omitted.
+    """
+    if isinstance(cellautomaton, ChunkedCA):
+        return cellautomaton.counts()
+    if isinstance(cellautomaton, dict):
+        counts = np.bincount(cellautomaton["code"].ravel(), minlength=len(cellautomaton["types"]))
+        return {str(category): int(count) for category, count in zip(cellautomaton["types"], counts) if count > 0}
+    return dict(Counter(cellautomaton[:, :, 0].flat))
+
+
+def StateHash(cellautomaton: np.ndarray) -> int:
+    """Return a hash of the cell types of a cellular automaton, metabolite levels are ignored.
+
+    Args:
+        cellautomaton (np.ndarray | ChunkedCA | dict): cellular automaton, possibly chunked or encoded (see EncodeCA).
+
+    Returns:
+        int: hash of the type layer.
+    """
+    if isinstance(cellautomaton, dict):
+        return hash(cellautomaton["code"].tobytes())
+    if isinstance(cellautomaton, ChunkedCA):
+        return hash(tuple((key, tuple(block[:, :, 0].flat)) for key, block in sorted(cellautomaton.chunks.items()) if block.dtype == object))
+    return hash(tuple(cellautomaton[:, :, 0].flat))
+
+
 def Moore(r: int) -> list[tuple[int, int]]:
     """
     Compute the Moore neighborhood of radius r.
@@ -63,156 +121,1277 @@ def VonNeumann(r: int) -> list[tuple[int, int]]:
     return vonneumann
 
 
-def DrawCA(cellautomaton: np.ndarray, colors: list, ax):
-    """Draw a 2D cellular automaton
+def GenerateCA_BC(n: int, cellcolors: dict, weights = None, m: int = None, chunk: int = None,
+                  dg: float = 130, dc: float = 5) -> np.ndarray:
+    """Generate the initial automaton of the BC model: a basement membrane of normal cells (last row) below empty cells
+    whose glucose and oxygen levels are the steady state of diffusion and consumption from the basement membrane.
 
     Args:
-        cellautomaton (np.array): Cellular Automata
-        ax : axes
-        colors (list): list of colors
+        n (int): number of rows, the basement membrane is the last one.
+        cellcolors (dict): colors assigned to cells.
+        weights (optional): unused, kept for compatibility with GuiCA.
+        m (int, optional): number of columns. Default None = n.
+        chunk (int, optional): chunk size, the automaton is returned as a ChunkedCA if given. Default None.
+        dg (float, optional): diffusion constant of glucose. Default 130.
+        dc (float, optional): diffusion constant of oxygen. Default 5.
 
-    Returns: a heatmap representing the CA.
+    Returns:
+        np.ndarray | ChunkedCA: initial cellular automaton.
     """
-    return sns.heatmap(
-        cellautomaton,
-        cmap=color.ListedColormap(colors),
-        linewidths=0.0000005,
-        cbar=False,
-        linecolor="lightgrey",
-        clip_on=False,
-        vmin=-0.5,
-        vmax=len(colors) - 0.5,
-        xticklabels=False,
-        yticklabels=False,
-        ax=ax,
-    )
+    m = n if m is None else m
+
+    # The 5-point stencil with zero-flux side boundaries (mirrored columns) and a basement row fixed at 1.0 has a solution
+    # which only depends on the row: left and right neighbors have the level of the cell, the stencil reduces to
+    # up + down + (2 - 4 - 1/d**2) * center = 0 on each row, solved as an n x n system instead of an n*n x n*n one.
+    def profile(d: float) -> np.ndarray:
+        A = np.zeros((n, n))
+        b = np.zeros(n)
+        for i in range(n - 1):
+            A[i, i] = -2 - (1/d**2)
+            if i > 0:
+                A[i, i - 1] = 1
+            A[i, i + 1] = 1
+        A[n - 1, n - 1] = 1  # basement membrane
+        b[n - 1] = 1.0
+        return np.linalg.solve(A, b)
+
+    glucose_levels = profile(dg)
+    oxygen_levels = profile(dc)
+
+    # Initialize grid with explicit 3D structure, row by row.
+    rows = np.empty((n, 1, 2), dtype=object)
+    for i in range(n):
+        if i == n - 1:  # basement
+            rows[i, 0, 0] = "normal"
+            rows[i, 0, 1] = (1.0, 1.0, 0.0, (None, None))
+        else:
+            rows[i, 0, 0] = "empty"
+            rows[i, 0, 1] = (glucose_levels[i], oxygen_levels[i], 0.0, (None, None))
+
+    if chunk is None:
+        return np.repeat(rows, m, axis=1)
+
+    ca_grid = ChunkedCA((n, m), chunk)
+    bottom = (n - 1) // chunk * chunk  # First row of the chunks holding the basement membrane.
+    ca_grid.store(bottom, 0, np.repeat(rows[bottom:], m, axis=1))
+    for i in range(0, bottom, chunk):
+        for j in range(0, m, chunk):
+            ca_grid.chunks[i // chunk, j // chunk] = np.array([env[:3] for env in rows[i:i+chunk, 0, 1]], dtype=np.float64)
+    return ca_grid
 
-def GenerateCA_BC(n: int, cellcolors: dict, weights = None) -> np.ndarray:
-    # ... [keep your diffusion matrix setup identical] ...
-    cells = list(cellcolors.keys())
 
-    dg = 130 
-    dc = 5  
+class SimulationTrace(list):
+    """Simulation trace = list of cellular automata, with information on the run attached.
 
-    # initialize matrices
-    A_glucose = np.zeros((n*n, n*n))
-    A_oxygen = np.zeros((n*n, n*n))
-    b_glucose = np.zeros(n*n)
-    b_oxygen = np.zeros(n*n)
+    Attributes:
+        start (int): step number of the first automaton of the trace, 0 unless the run was resumed from a checkpoint.
+        steps (list): step numbers of the automata when not all the steps are recorded, None otherwise.
+        termination (str): reason why the simulation stopped, "duration" if it ran for the full duration.
+        profile (Profiler): instrumentation of the run if SimulateCA_BC was given a profiler, None otherwise.
+        causes (list): event counters of every step (arrays (len(EVENTS), len(types))) if SimulateCA_BC was given an
+            EventCounter or for SimulateCA_BC_fast, None otherwise.
+    """
+    start: int = 0
+    steps: list = None
+    termination: str = "duration"
+    profile = None
+    causes: list = None
 
-    for i in range(n):
-        for j in range(n):
-            index = i * n + j
-            
-            if i == n - 1:  # basement membrane
-                A_glucose[index, index] = 1
-                A_oxygen[index, index] = 1
-                b_glucose[index] = 1.0
-                b_oxygen[index] = 1.0
-            else:
-                # standard 5-point stencil
-                A_glucose[index, index] = -4 - (1/dg**2)
-                A_oxygen[index, index] = -4 - (1/dc**2)
-                
-                # neighbors
-                for di, dj in [(-1,0), (1,0), (0,-1), (0,1)]:
-                    ni, nj = i + di, j + dj
-                    
-                    if 0 <= ni < n:  # walid row index
-                        if 0 <= nj < n:  # normal interior neighbor
-                            A_glucose[index, ni*n + nj] = 1
-                            A_oxygen[index, ni*n + nj] = 1
-                        else:  # side boundary (! USE zero-flux)
-                            # mirror index: reflects back into the domain
-                            mirrored_nj = j if (nj < 0) else (2*(n-1) - j)
-                            A_glucose[index, ni*n + mirrored_nj] += 1
-                            A_oxygen[index, ni*n + mirrored_nj] += 1
-
-    # solve
-    glucose_levels = np.linalg.solve(A_glucose, b_glucose).reshape(n, n)
-    oxygen_levels = np.linalg.solve(A_oxygen, b_oxygen).reshape(n, n)
-    
-    # Initialize grid with explicit 3D structure
-    ca_grid = np.empty((n, n, 2), dtype=object)
-    for i in range(n):
-        for j in range(n):
-            if i == n - 1:  # basement
-                cell_type = "normal"
-                metabolites = (1.0, 1.0, 0.0, (None, None))
+
+class Termination:
+    """Termination conditions checked after each simulation step on the cell counts and the state hash.
+
+    Args:
+        extinction (bool, optional): stop when the tumor died out: no tumor cell (neither normal nor empty) is left after
+            there was one, the normal cells of the basement membrane do not count. Default True.
+        invasion (float, optional): stop when the fraction of invasive (not normal) cells among the occupied cells reaches this value, 1.0 = full invasion. Default None (disabled).
+        window (int, optional): stop when the cell types (fixed point) or the type composition (stationary) did not change for window steps. Default None (disabled).
+        max_steps (int, optional): step budget. Default None (disabled).
+        max_time (float, optional): wall-clock budget in seconds. Default None (disabled).
+    """
+
+    def __init__(self, extinction: bool = True, invasion: float = None, window: int = None,
+                 max_steps: int = None, max_time: float = None):
+        assert invasion is None or 0 < invasion <= 1
+        assert window is None or window > 0
+        assert max_steps is None or max_steps > 0
+        assert max_time is None or max_time > 0
+        self.extinction = extinction
+        self.invasion = invasion
+        self.window = window
+        self.max_steps = max_steps
+        self.max_time = max_time
+        self.reset()
+
+    def reset(self, counts: dict = None):  # Start a new run, from a state with these counts {type: number of cells}.
+        self.start = perf_counter()
+        self.last = None  # (counts, hash) of the previous step.
+        self.unchanged = [0, 0]  # Number of steps without change of [composition, types].
+        self.tumor = counts is not None and Termination._tumor(counts) > 0  # A tumor cell appeared.
+
+    @staticmethod
+    def _tumor(counts: dict) -> int:  # Number of tumor cells, neither normal nor empty.
+        return sum(count for category, count in counts.items() if category not in ("empty", "normal"))
+
+    def check(self, step: int, counts: dict, statehash: int):
+        """Check the conditions on the state reached at a step.
+
+        Args:
+            step (int): step number.
+            counts (dict): {type: number of cells} of the state.
+            statehash (int): hash of the state, see StateHash.
+
+        Returns:
+            str: reason of the termination, None if the simulation continues.
+        """
+        occupied = sum(counts.values()) - counts.get("empty", 0)
+        tumor = Termination._tumor(counts)
+        self.tumor = self.tumor or tumor > 0
+        composition = tuple(sorted(counts.items()))
+
+        if self.last is not None:
+            self.unchanged[0] = self.unchanged[0] + 1 if composition == self.last[0] else 0
+            self.unchanged[1] = self.unchanged[1] + 1 if statehash == self.last[1] else 0
+        self.last = (composition, statehash)
+
+        if self.extinction and self.tumor and tumor == 0:
+            return "extinction"
+        if self.invasion is not None and occupied > 0 and tumor / occupied >= self.invasion:
+            return "invasion"
+        if self.window is not None and self.unchanged[1] >= self.window:
+            return "fixed point"
+        if self.window is not None and self.unchanged[0] >= self.window:
+            return "stationary"
+        if self.max_steps is not None and step >= self.max_steps:
+            return "step budget"
+        if self.max_time is not None and perf_counter() - self.start >= self.max_time:
+            return "time budget"
+        return None
+
+
+_ACTIVEFRACTION = 0.4  # Above this fraction of active cells, evaluating the whole grid is faster (100 x 100 grid).
+
+
+def ActiveRegion(cellautomaton: np.ndarray, radius: int = 1) -> np.ndarray:
+    """Return the active region of a cellular automaton: the occupied (not empty) cells plus a margin of radius cells.
+    The borders are mirrored as in SimulateCA_BC.
+
+    Args:
+        cellautomaton (np.ndarray): cellular automaton
+        radius (int, optional): margin = neighborhood radius. Default 1.
+
+    Returns:
+        np.ndarray: boolean mask of the active cells.
+    """
+    n, m = cellautomaton.shape[:2]
+    occupied = np.pad(cellautomaton[:, :, 0] != "empty", radius, mode="edge")
+    active = np.zeros((n, m), dtype=bool)
+    for di in range(2 * radius + 1):
+        for dj in range(2 * radius + 1):
+            active |= occupied[di:di+n, dj:dj+m]
+    return active
+
+
+def EmptyStep(cellautomaton: np.ndarray) -> np.ndarray:
+    """Compute one step of a cellular automaton in which every cell is assumed empty: the metabolite levels are replaced by
+    the mean of the Von Neumann neighbors (mirrored borders) and the basement membrane (last row) is kept at (1.0, 1.0, 0.0).
+    This is the update of UpdateMetabolites for empty cells, computed on the whole grid at once.
+
+    Args:
+        cellautomaton (np.ndarray): cellular automaton
+
+    Returns:
+        np.ndarray: new cellular automaton made of empty cells.
+    """
+    n, m = cellautomaton.shape[:2]
+    levels = np.array([env[:3] for env in cellautomaton[:, :, 1].flat], dtype=np.float64).reshape(n, m, 3)
+    padded = np.pad(levels, ((1, 1), (1, 1), (0, 0)), mode="edge")
+    # Same summation order as UpdateMetabolites (up, left, right, down) to get identical values.
+    levels = (((padded[:-2, 1:-1] + padded[1:-1, :-2]) + padded[1:-1, 2:]) + padded[2:, 1:-1]) / 4
+    levels[-1] = (1.0, 1.0, 0.0)
+
+    canew = np.empty((n, m, 2), dtype=object)
+    canew[:, :, 0] = "empty"
+    envs = np.empty(n * m, dtype=object)
+    for index, (glucose, oxygen, acid) in enumerate(levels.reshape(-1, 3).tolist()):
+        envs[index] = (glucose, oxygen, acid, (None, None))
+    canew[:, :, 1] = envs.reshape(n, m)
+    return canew
+
+
+class ChunkedCA:
+    """Cellular automaton stored by square chunks of size x size cells in a dictionary {(chunk row, chunk column): chunk}.
+    A chunk made of empty cells whose metabolite levels are uniform along each row (up to tol) is stored as its
+    profile, an array of (glucose, oxygen, H+) per row; it is materialized only when it enters the window of a step.
+    The other chunks are stored as cellular automata.
+
+    Args:
+        shape (tuple[int, int]): number of rows and columns of the automaton.
+        size (int, optional): chunk size. Default 64.
+        tol (float, optional): tolerance on the variation of metabolite levels along a row of a profile chunk. Default 1e-9.
+    """
+
+    def __init__(self, shape: tuple[int, int], size: int = 64, tol: float = 1e-9):
+        assert size > 0
+        assert tol >= 0
+        self.shape = tuple(shape)
+        self.size = size
+        self.tol = tol
+        self.chunks = {}
+
+    @classmethod
+    def FromDense(cls, cellautomaton: np.ndarray, size: int = 64, tol: float = 1e-9):
+        """Chunk a cellular automaton."""
+        chunked = cls(cellautomaton.shape[:2], size, tol)
+        chunked.store(0, 0, cellautomaton)
+        return chunked
+
+    def store(self, r0: int, c0: int, cellautomaton: np.ndarray):
+        """Store an automaton whose upper left corner (r0, c0) and size are aligned on chunks, compressing the uniform empty chunks."""
+        n, m = cellautomaton.shape[:2]
+        for i in range(0, n, self.size):
+            for j in range(0, m, self.size):
+                block = cellautomaton[i:i+self.size, j:j+self.size]
+                profile = None
+                if (block[:, :, 0] == "empty").all():
+                    levels = np.array([env[:3] for env in block[:, :, 1].flat], dtype=np.float64).reshape(block.shape[:2] + (3,))
+                    if (np.ptp(levels, axis=1) <= self.tol).all():
+                        profile = levels[:, 0]
+                self.chunks[(r0 + i) // self.size, (c0 + j) // self.size] = block.copy() if profile is None else profile
+
+    def window(self, r0: int, r1: int, c0: int, c1: int) -> np.ndarray:
+        """Materialize rows [r0, r1) and columns [c0, c1) as a cellular automaton."""
+        cellautomaton = np.empty((r1 - r0, c1 - c0, 2), dtype=object)
+        for bi in range(r0 // self.size, (r1 - 1) // self.size + 1):
+            for bj in range(c0 // self.size, (c1 - 1) // self.size + 1):
+                block = self.chunks[bi, bj]
+                i0, j0 = bi * self.size, bj * self.size  # Position of the chunk.
+                rows = slice(max(r0 - i0, 0), min(r1 - i0, self.size))
+                cols = slice(max(c0 - j0, 0), min(c1 - j0, self.size))
+                target = cellautomaton[i0 + rows.start - r0:i0 + rows.stop - r0, j0 + cols.start - c0:j0 + cols.stop - c0]
+                if block.dtype == object:
+                    target[:] = block[rows, cols]
+                else:
+                    target[:, :, 0] = "empty"
+                    for i, (glucose, oxygen, acid) in enumerate(block[rows].tolist()):
+                        for j in range(target.shape[1]):
+                            target[i, j, 1] = (glucose, oxygen, acid, (None, None))
+        return cellautomaton
+
+    def dense(self) -> np.ndarray:
+        """Materialize the whole automaton."""
+        return self.window(0, self.shape[0], 0, self.shape[1])
+
+    def counts(self) -> dict[str, int]:
+        """Number of cells of each type, see CountTypes."""
+        counts = Counter()
+        for (_, bj), block in self.chunks.items():
+            if block.dtype == object:
+                counts.update(block[:, :, 0].flat)
             else:
-                cell_type = "empty"
-                metabolites = (glucose_levels[i,j], oxygen_levels[i,j], 0.0, (None, None))
-            ca_grid[i,j,0] = cell_type
-            ca_grid[i,j,1] = metabolites
-    return ca_grid
+                counts["empty"] += block.shape[0] * min(self.size, self.shape[1] - bj * self.size)
+        return dict(counts)
+
+    def relax(self, key: tuple[int, int]) -> np.ndarray:
+        """Profile of a profile chunk after one step, see EmptyStep. The chunks above and below are assumed to be profiles
+        and the left and right neighbors to have the same levels."""
+        bi, bj = key
+        profile = self.chunks[key]
+        above, below = self.chunks.get((bi - 1, bj)), self.chunks.get((bi + 1, bj))
+        up = profile[:1] if above is None else above[-1:]  # Mirrored top border.
+        down = profile[-1:] if below is None else below[:1]
+        padded = np.concatenate((up, profile, down))
+        # Same summation order as EmptyStep: up, left, right, down.
+        profile = (((padded[:-2] + padded[1:-1]) + padded[1:-1]) + padded[2:]) / 4
+        if (bi + 1) * self.size >= self.shape[0]:  # basement membrane
+            profile[self.shape[0] - 1 - bi * self.size] = (1.0, 1.0, 0.0)
+        return profile
+
+
+def Dense(cellautomaton) -> np.ndarray:
+    """Return a cellular automaton as an array, materializing it if it is chunked or encoded.
+
+    Args:
+        cellautomaton (np.ndarray | ChunkedCA | dict): cellular automaton, possibly chunked or encoded (see EncodeCA).
+
+    Returns:
+        np.ndarray: cellular automaton.
+    """
+    if isinstance(cellautomaton, ChunkedCA):
+        return cellautomaton.dense()
+    if isinstance(cellautomaton, dict):
+        return DecodeCA(cellautomaton)
+    return cellautomaton
+
+
+_MOORE1 = Moore(1)  # Displacements of the daughter targets.
+_MOORE1CODE = {displacement: i for i, displacement in enumerate(_MOORE1)}
+_STATEFIELDS = {"code": np.uint8, "glucose": np.float64, "oxygen": np.float64, "acid": np.float64,
+                "target": np.int8, "daughter": np.uint8}  # Typed arrays of an encoded automaton.
+
+
+def _targetcode(target) -> int:  # Code of a daughter target, see EncodeCA.
+    if target is None:
+        return -1
+    if isinstance(target, int):
+        return 8 + target
+    return _MOORE1CODE[tuple(target)]
+
+
+def _targetvalue(code: int):  # Daughter target of a code, inverse of _targetcode.
+    if code < 0:
+        return None
+    if code < 8:
+        return _MOORE1[code]
+    return code - 8
 
 
-def SimulateCA_BC(cellautomaton0: np.ndarray, f, neighborhood=Moore(1), duration: int = 100) -> list:
+def EncodeCA(cellautomaton: np.ndarray, types: list = None) -> dict[str, np.ndarray]:
+    """Encode a cellular automaton of the BC model into typed arrays.
+    A cell (type, (glucose, oxygen, H+, (target, daughter))) is split over the arrays of the same key.
+    The target is coded by -1 if None, by its index in Moore(1) if it is a displacement and by 8 + index if it is a neighbor index.
+
+    Args:
+        cellautomaton (np.ndarray): cellular automaton
+        types (list, optional): list of types, the code of a type is its position. Default None = sorted types found in the automaton.
+
+    Returns:
+        dict[str, np.ndarray]: arrays types, code, glucose, oxygen, acid, target and daughter (255 if None).
+    """
+    shape = cellautomaton.shape[:2]
+    cells = cellautomaton.reshape(-1, 2)
+    if types is None:
+        types = sorted({category for category in cells[:, 0]} | {env[3][1] for env in cells[:, 1] if env[3][1] is not None})
+    codes = {category: i for i, category in enumerate(types)}
+
+    envs = cells[:, 1]
+    return {
+        "types": np.array(types),
+        "code": np.array([codes[category] for category in cells[:, 0]], dtype=np.uint8).reshape(shape),
+        "glucose": np.array([env[0] for env in envs], dtype=np.float64).reshape(shape),
+        "oxygen": np.array([env[1] for env in envs], dtype=np.float64).reshape(shape),
+        "acid": np.array([env[2] for env in envs], dtype=np.float64).reshape(shape),
+        "target": np.array([_targetcode(env[3][0]) for env in envs], dtype=np.int8).reshape(shape),
+        "daughter": np.array([255 if env[3][1] is None else codes[env[3][1]] for env in envs], dtype=np.uint8).reshape(shape),
+    }
+
+
+def DecodeCA(state: dict) -> np.ndarray:
+    """Rebuild the cellular automaton encoded by EncodeCA.
+
+    Args:
+        state (dict): typed arrays of the automaton.
+
+    Returns:
+        np.ndarray: cellular automaton.
+    """
+    types = [str(category) for category in state["types"]]
+    shape = state["code"].shape
+    cellautomaton = np.empty(shape + (2,), dtype=object)
+    fields = zip(*(state[key].ravel().tolist() for key in _STATEFIELDS))
+    for index, (code, glucose, oxygen, acid, target, daughter) in enumerate(fields):
+        i, j = divmod(index, shape[1])
+        cellautomaton[i, j, 0] = types[code]
+        cellautomaton[i, j, 1] = (glucose, oxygen, acid, (_targetvalue(target), None if daughter == 255 else types[daughter]))
+    return cellautomaton
+
+
+_PARAMS = ("a0", "pa", "k", "hN", "hT", "dg", "dc")
+
+
+def _params(f=None) -> dict:
+    """Current parameters of the BC model: those of the module of the rule f (the rule BC if f is None) if it is loaded
+    and has them, else those of BC_utils."""
+    module = sys.modules.get("BC" if f is None else getattr(f, "__module__", None))
+    if module is None or not all(hasattr(module, name) for name in _PARAMS):
+        import BC_utils as module
+    return {name: getattr(module, name) for name in _PARAMS}
+
+
+def SaveCheckpoint(path: str, cellautomaton: np.ndarray, step: int, duration: int, neighborhood: list, params: dict = None):
+    """Save a checkpoint of a simulation: automaton, step, parameters and state of the random generator.
+    The file is written next to its destination then renamed, so an interruption never leaves a truncated checkpoint.
+
+    Args:
+        path (str): checkpoint file (.npz).
+        cellautomaton (np.ndarray): cellular automaton reached at step.
+        step (int): step number.
+        duration (int): total number of steps of the simulation.
+        neighborhood (list[tuple]): cell neighborhood.
+        params (dict, optional): model parameters (a0, pa, k, hN, hT, dg, dc). Default None = the current ones.
+    """
+    version, internal, gauss = random.getstate()
+    tmppath = path + ".tmp"
+    with open(tmppath, "wb") as file:
+        np.savez_compressed(
+            file,
+            step=step,
+            duration=duration,
+            neighborhood=np.array(neighborhood, dtype=int),
+            params=np.array(json.dumps(_params() if params is None else params)),
+            rng_version=version,
+            rng_state=np.array(internal, dtype=np.int64),
+            rng_gauss=np.nan if gauss is None else gauss,
+            **EncodeCA(cellautomaton),
+        )
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmppath, path)
+
+
+def LoadCheckpoint(path: str) -> dict:
+    """Load a checkpoint saved by SaveCheckpoint and restore the state of the random generator.
+
+    Args:
+        path (str): checkpoint file.
+
+    Returns:
+        dict: cellautomaton, step, duration, neighborhood and params.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        gauss = float(data["rng_gauss"])
+        random.setstate((int(data["rng_version"]), tuple(int(x) for x in data["rng_state"]), None if np.isnan(gauss) else gauss))
+        return {
+            "cellautomaton": DecodeCA(data),
+            "step": int(data["step"]),
+            "duration": int(data["duration"]),
+            "neighborhood": [tuple(int(x) for x in displacement) for displacement in data["neighborhood"]],
+            "params": json.loads(str(data["params"])),
+        }
+
+
+class Checkpoint:
+    """Periodic checkpoints of a simulation, see SaveCheckpoint.
+
+    Args:
+        path (str): checkpoint file (.npz), replaced at each checkpoint.
+        every (int, optional): number of steps between two checkpoints. Default 50.
+        params (dict, optional): model parameters recorded in the checkpoint. Default None = the current ones.
+    """
+
+    def __init__(self, path: str, every: int = 50, params: dict = None):
+        assert every > 0
+        self.path = path
+        self.every = every
+        self.params = params
+
+
+def SpatialColumns(shape: tuple, types: list) -> list[str]:
+    """Names of the statistics of SpatialStats on a grid of the given shape: depth, roughness, clones_<type>,
+    largest_<type> for the occupied types, and size_<s> = number of clones of s to 2s - 1 cells, s = 1, 2, 4, ..."""
+    occupied = [category for category in types if category != "empty"]
+    bins = int(np.log2(shape[0] * shape[1])) + 1
+    return (["depth", "roughness"] + [f"clones_{category}" for category in occupied]
+            + [f"largest_{category}" for category in occupied] + [f"size_{2**b}" for b in range(bins)])
+
+
+def SpatialStats(codes: np.ndarray, types: list) -> dict[str, float]:
+    """Spatial statistics of the tumor on a grid of type codes (see CodeStack), the basement membrane being the last row.
+      - depth: largest distance of an occupied cell from the basement row, in rows,
+      - roughness: standard deviation over the columns of the height of the front (distance of the highest occupied cell),
+      - clones_<type>, largest_<type>: number of clones of a type and size of the largest one, a clone being a connected
+        component of cells of the same type (Moore neighborhood), the basement membrane included,
+      - size_<s>: number of clones of any type with s to 2s - 1 cells.
+
+    Args:
+        codes (np.ndarray): type codes (rows, columns).
+        types (list): cell types of the codes.
+
+    Returns:
+        dict[str, float]: statistics named as in SpatialColumns.
+    """
+    from scipy import ndimage
+    n, m = codes.shape
+    empty = types.index("empty")
+    occupied = codes != empty
+    height = np.where(occupied, (n - 1 - np.arange(n))[:, None], 0).max(0)
+    statistics = {"depth": int(height.max()), "roughness": float(height.std())}
+
+    bins = int(np.log2(n * m)) + 1
+    histogram = np.zeros(bins, dtype=int)
+    present = np.bincount(codes.ravel(), minlength=len(types))
+    for code, category in enumerate(types):
+        if code == empty:
+            continue
+        sizes = np.zeros(0, dtype=int)
+        if present[code]:
+            labels, number = ndimage.label(codes == code, structure=np.ones((3, 3), dtype=int))
+            sizes = np.bincount(labels.ravel(), minlength=number + 1)[1:]
+            histogram += np.bincount(np.log2(sizes).astype(int), minlength=bins)
+        statistics[f"clones_{category}"] = len(sizes)
+        statistics[f"largest_{category}"] = int(sizes.max()) if len(sizes) else 0
+    statistics |= {f"size_{2**b}": int(count) for b, count in enumerate(histogram)}
+    return statistics
+
+
+class CountWriter:
+    """Sink of the cell counts of a simulation, attached to the simulation loop (counts argument of the engines).
+    A row (Iteration + one count per type) is appended at every step and written every buffer steps, so a crashed run
+    keeps its counts up to the last flush. Run metadata (parameters, seed, grid size, engine, termination...) are
+    written in a JSON sidecar file, path + ".json". The engines give the model parameters and the seed they used,
+    the params of the writer are added to them (and take precedence).
+
+    The path is a template formatted with params, e.g. "cellcounts/{a0}_run{run}_{pathway}.csv". The field {pathway}
+    is resolved when the run ends by label(typescount) (e.g. BC_utils.classify_pathway) on all the rows of the file,
+    the file is named with "running" until then. An interrupted run keeps the "running" name, so that a run resumed
+    from a checkpoint (start > 0) continues its file, cut back to the rows up to the checkpoint step.
+
+    Formats: "csv", or "columns" = a directory holding one binary int32 file per column (Iteration.i4, empty.i4, ...),
+    readable with ReadCounts or np.fromfile.
+
+    With stats, the spatial statistics of SpatialStats follow the counts in every row (float64 files .f8 in the
+    "columns" format), computed from the grid of type codes given by the engine. With events, the event counters of
+    the step by phenotype (EventColumns) follow, as given by the engine (SimulateCA_BC and SimulateCA_BC_fast).
+
+    Args:
+        path (str): template of the output path.
+        types (list): cell types, one column each.
+        params (dict, optional): parameters of the run, used by the template and saved in the metadata. Default None.
+        format (str, optional): "csv" or "columns". Default "csv".
+        buffer (int, optional): number of rows kept before writing. Default 50.
+        label (fun, optional): label(typescount) -> str giving the {pathway} field. Default None.
+        overwrite (bool, optional): replace an existing output of a new run, otherwise an error is raised. Default False.
+        stats (bool, optional): add the spatial statistics of SpatialStats to the counts. Default False.
+        events (bool, optional): add the event counters of the step to the counts. Default False.
+    """
+
+    def __init__(self, path: str, types: list, params: dict = None, format: str = "csv", buffer: int = 50,
+                 label=None, overwrite: bool = False, stats: bool = False, events: bool = False):
+        assert format in ("csv", "columns"), errmsg("Unknown count format", format)
+        assert buffer > 0
+        self.template = path
+        self.types = list(types)
+        self.params = dict(params or {})
+        self.format = format
+        self.buffer = buffer
+        self.label = label
+        self.overwrite = overwrite
+        self.stats = stats
+        self.statscolumns = []
+        self.events = events
+        self.eventcolumns = EventColumns(self.types) if events else []
+        self.path = None
+        self.metadata = None
+        self._rows = []
+        self._files = None
+
+    def _resolve(self, pathway: str) -> str:
+        return self.template.format(**self.params, pathway=pathway)
+
+    def _sidecar(self):
+        with open(self.path + ".json", "w") as file:
+            json.dump(self.metadata, file, indent=1, default=str)
+
+    def open(self, shape: tuple, engine: str, start: int = 0, params: dict = None, seed=None):
+        """Called by the engine at the start of the run with the model parameters and the seed it uses."""
+        self.path = self._resolve("running")
+        append = start > 0 and os.path.exists(self.path)  # A resumed run continues its file.
+        assert append or self.overwrite or not os.path.exists(self.path), errmsg("Count file already exists", self.path)
+        if append:
+            self._cut(start)
+            if seed is None and os.path.exists(self.path + ".json"):  # The seed of the interrupted run.
+                with open(self.path + ".json") as file:
+                    seed = json.load(file).get("seed")
+        folder = self.path if self.format == "columns" else os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.statscolumns = SpatialColumns(shape, self.types) if self.stats else []
+        self.metadata = {"params": (params or {}) | self.params, "seed": self.params.get("seed", seed),
+                         "rows": shape[0], "columns": shape[1],
+                         "engine": engine, "types": self.types, "stats": self.statscolumns, "events": self.eventcolumns,
+                         "format": self.format, "start": start,
+                         "started": datetime.now().isoformat(timespec="seconds"), "termination": None}
+        self._started = perf_counter()
+        self._sidecar()
+        mode = "a" if append else "w"
+        if self.format == "csv":
+            self._files = open(self.path, mode, newline="")
+            if not append:
+                csv.writer(self._files).writerow(["Iteration"] + self.types + self.statscolumns + self.eventcolumns)
+        else:
+            self._files = {column: open(os.path.join(self.path, column + ".i4"), mode + "b") for column in ["Iteration"] + self.types}
+            self._files |= {column: open(os.path.join(self.path, column + ".f8"), mode + "b") for column in self.statscolumns}
+            self._files |= {column: open(os.path.join(self.path, column + ".i4"), mode + "b") for column in self.eventcolumns}
+
+    def write(self, step: int, counts: dict[str, int], codes: np.ndarray = None, events: np.ndarray = None):
+        """Append the counts of a step, missing types count 0, the statistics of the grid of codes if stats is set
+        and the event counters (array (len(EVENTS), len(types)), see EventCounter) if events is set."""
+        row = [step] + [counts.get(category, 0) for category in self.types]
+        if self.stats:
+            assert codes is not None, errmsg("Spatial statistics need the grid of codes of step", step)
+            statistics = SpatialStats(codes, self.types)
+            row += [statistics[column] for column in self.statscolumns]
+        if self.events:
+            assert events is not None, errmsg("No event counters given by the engine at step", step)
+            row += [int(events[e, t]) for e in range(len(EVENTS)) for t, category in enumerate(self.types) if category != "empty"]
+        self._rows.append(row)
+        if len(self._rows) >= self.buffer:
+            self.flush()
+
+    def flush(self):  # Write the buffered rows.
+        if not self._rows:
+            return
+        if self.format == "csv":
+            csv.writer(self._files).writerows(self._rows)
+            self._files.flush()
+        else:
+            columns = np.array(self._rows, dtype=np.float64).T
+            for (name, file), column in zip(self._files.items(), columns):
+                column.astype("<f8" if name in self.statscolumns else "<i4").tofile(file)
+                file.flush()
+        self._rows = []
+
+    def _cut(self, start: int):  # Drop the rows after the step start, written by the run after its checkpoint.
+        if self.format == "csv":
+            with open(self.path, newline="") as file:
+                rows = list(csv.reader(file))
+            with open(self.path, "w", newline="") as file:
+                csv.writer(file).writerows(rows[:1] + [row for row in rows[1:] if int(row[0]) <= start])
+        else:
+            steps = np.fromfile(os.path.join(self.path, "Iteration.i4"), dtype="<i4")
+            kept = int(np.count_nonzero(steps <= start))
+            for name in os.listdir(self.path):
+                os.truncate(os.path.join(self.path, name), kept * (8 if name.endswith(".f8") else 4))
+
+    def close(self, termination: str = None):  # Called by the engine at the end of the run.
+        self.flush()
+        for file in ([self._files] if self.format == "csv" else self._files.values()):
+            file.close()
+        self.metadata |= {"termination": termination, "seconds": perf_counter() - self._started}
+        if termination != "interrupted" and self.label is not None and "{pathway}" in self.template:
+            self._sidecar()
+            counts = ReadCounts(self.path)  # The whole run, including the rows written before a resumption.
+            pathway = str(self.label({category: counts[category].tolist() for category in self.types}))
+            final = self._resolve(pathway)
+            if os.path.exists(final):
+                assert self.overwrite, errmsg("Count file already exists", final)
+                if os.path.isdir(final):
+                    shutil.rmtree(final)
+                if os.path.exists(final + ".json"):
+                    os.remove(final + ".json")
+            os.replace(self.path, final)
+            os.remove(self.path + ".json")
+            self.path = final
+            self.metadata["pathway"] = pathway
+        self._sidecar()
+
+
+def ReadCounts(path: str) -> dict[str, np.ndarray]:
+    """Read the counts written by CountWriter (csv file or directory of columns) or by WriteCellCounts.
+
+    Args:
+        path (str): count file or directory.
+
+    Returns:
+        dict[str, np.ndarray]: {column: values}, the columns of a directory are memory-mapped.
+    """
+    if os.path.isdir(path):
+        with open(path + ".json") as file:
+            metadata = json.load(file)
+        columns = {column: np.memmap(os.path.join(path, column + ".i4"), dtype="<i4", mode="r")
+                   for column in ["Iteration"] + metadata["types"]}
+        columns |= {column: np.memmap(os.path.join(path, column + ".f8"), dtype="<f8", mode="r")
+                    for column in metadata.get("stats", [])}
+        return columns | {column: np.memmap(os.path.join(path, column + ".i4"), dtype="<i4", mode="r")
+                          for column in metadata.get("events", [])}
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    values = np.array(rows[1:], dtype=float).reshape(-1, len(rows[0]))
+    return {column: values[:, i].astype(int) if np.all(values[:, i] == np.round(values[:, i])) else values[:, i]
+            for i, column in enumerate(rows[0])}
+
+
+# Profiling of SimulateCA_BC: the active profiler and event counter are reachable by the local rule through Branch.
+_profiler = None
+_events = None
+EVENTS = ("death by acid", "death by ATP", "quiescent", "blocked division", "division", "mutation")  # Counted outcomes.
+
+
+def Branch(name: str, phenotype: str = None):
+    """Count a branch of the local rule (e.g. "division") when SimulateCA_BC runs with a Profiler, and the outcome of
+    a cell of the given phenotype when it runs with an EventCounter, do nothing otherwise.
+
+    Args:
+        name (str): name of the branch, see Profiler.BRANCHES and EVENTS.
+        phenotype (str, optional): phenotype of the cell. Default None (not an outcome).
+    """
+    if _profiler is not None:
+        _profiler.branches[name] += 1
+    if _events is not None and phenotype is not None:
+        _events.current[name][phenotype] += 1
+
+
+class EventCounter:
+    """Per-step counters of the outcomes of the local rule by phenotype, filled by Branch during SimulateCA_BC.
+    Outcomes (EVENTS): death by acid, death by ATP, quiescent (no division drawn), blocked division (no empty neighbor),
+    division, and mutation (daughter whose phenotype differs from its parent's, counted by parent phenotype).
+
+    Args:
+        types (list): all the cell types.
+
+    Attributes:
+        history (list[np.ndarray]): one array (len(EVENTS), len(types)) per step, step 0 included.
+    """
+
+    def __init__(self, types: list):
+        self.types = list(types)
+        self.history = []
+        self.reset()
+
+    def reset(self):  # Start a new step.
+        self.current = {event: dict.fromkeys(self.types, 0) for event in EVENTS}
+
+    def endstep(self) -> np.ndarray:  # Close a step, return its counters.
+        row = np.array([[self.current[event][category] for category in self.types] for event in EVENTS], dtype=np.int64)
+        self.history.append(row)
+        self.reset()
+        return row
+
+
+def EventColumns(types: list) -> list[str]:
+    """Names of the event counters written by CountWriter: <event>_<type>, spaces replaced by _, e.g. death_by_acid_AH."""
+    return [f"{event.replace(' ', '_')}_{category}" for event in EVENTS for category in types if category != "empty"]
+
+
+def EventCounts(causes: list, types: list) -> dict[str, list[int]]:
+    """Series of the event counters of a run (causes attribute of a simulation trace), {column of EventColumns: count per step}."""
+    causes = np.array(causes)
+    return {f"{event.replace(' ', '_')}_{category}": causes[:, e, t].tolist()
+            for e, event in enumerate(EVENTS) for t, category in enumerate(types) if category != "empty"}
+
+
+class Profiler:
+    """Opt-in instrumentation of SimulateCA_BC: wall time and number of calls of the phases of a step
+    and number of cells per branch of the local rule (see Branch). Without profiler, SimulateCA_BC runs uninstrumented.
+
+    Phases: padding (padded array), neighbors (neighbor tuples), rule (calls of f, UpdateMetabolites included),
+    UpdateMetabolites and the helper functions of the rule given in functions, basement (basement membrane and detachment
+    fix-up), EmptyStep (vectorized update of the inactive cells).
+
+    Args:
+        trace (str, optional): csv file receiving the times and branch counts of every step. Default None.
+        functions (tuple, optional): helper functions of the rule timed through its module, by name. Default ("UpdateMetabolites",).
+    """
+    PHASES = ("padding", "neighbors", "rule", "UpdateMetabolites", "basement", "EmptyStep")
+    BRANCHES = ("empty", "death by acid", "death by ATP", "quiescent", "blocked division", "division", "mutation")
+
+    def __init__(self, trace: str = None, functions: tuple = ("UpdateMetabolites",)):
+        self.trace = trace
+        self.functions = functions
+        self.times = Counter()  # {phase: seconds}
+        self.calls = Counter()  # {phase: number of calls}
+        self.branches = Counter()  # {branch: number of cells}
+        self.steps = 0
+        self._columns = self.PHASES + tuple(name for name in functions if name not in self.PHASES)
+        self._file = None
+        self._last = (Counter(), Counter())
+
+    @contextmanager
+    def phase(self, name: str):  # Time a block of code.
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += perf_counter() - start
+            self.calls[name] += 1
+
+    def wrap(self, name: str, fun):  # Timed version of a function.
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return fun(*args)
+            finally:
+                self.times[name] += perf_counter() - start
+                self.calls[name] += 1
+        return timed
+
+    def attach(self, f):  # Time the helper functions in the module of f, return the function restoring them.
+        scope = getattr(f, "__globals__", {})
+        saved = {name: scope[name] for name in self.functions if name in scope}
+        scope.update({name: self.wrap(name, fun) for name, fun in saved.items()})
+        if self.trace is not None:
+            self._file = open(self.trace, "w", newline="")
+            csv.writer(self._file).writerow(["step"] + [f"{phase} (s)" for phase in self._columns] + list(self.BRANCHES))
+
+        def detach():
+            scope.update(saved)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return detach
+
+    def endstep(self, step: int):  # Close a step, write its row in the trace.
+        self.steps += 1
+        if self._file is not None:
+            times, branches = self._last
+            row = [step] + [self.times[phase] - times[phase] for phase in self._columns]
+            row += [self.branches[branch] - branches[branch] for branch in self.BRANCHES]
+            csv.writer(self._file).writerow(row)
+            self._file.flush()
+            self._last = (self.times.copy(), self.branches.copy())
+
+    def stats(self) -> dict:
+        """Accumulated statistics: steps, times {phase: seconds}, calls {phase: calls} and branches {branch: cells}."""
+        return {"steps": self.steps, "times": dict(self.times), "calls": dict(self.calls), "branches": dict(self.branches)}
+
+    def __str__(self) -> str:
+        total = sum(self.times[phase] for phase in ("padding", "neighbors", "rule", "basement", "EmptyStep"))
+        lines = [f"{'phase':20}{'seconds':>12}{'calls':>12}{'share':>8}"]
+        for phase in self._columns:
+            if self.calls[phase]:
+                lines.append(f"{phase:20}{self.times[phase]:>12.4f}{self.calls[phase]:>12}{self.times[phase] / total if total else 0:>8.1%}")
+        cells = sum(self.branches.values())
+        lines.append(f"{'branch':20}{'cells':>12}")
+        for branch, count in self.branches.most_common():
+            lines.append(f"{branch:20}{count:>12}{count / cells:>8.1%}")
+        return "\n".join(lines)
+
+
+def SimulateCA_BC(cellautomaton0: np.ndarray, f, neighborhood=Moore(1), duration: int = 100,
+                  termination: Termination = None, checkpoint: Checkpoint = None, start: int = 0,
+                  active: bool = True, profile: Profiler = None, callback=None, counts: CountWriter = None,
+                  events: EventCounter = None, seed=None) -> SimulationTrace:
     """
     Modified version with detachment detection
+
+    Args:
+        cellautomaton0 (np.ndarray | ChunkedCA): initial cellular automaton, the automata of the trace are chunked if it is chunked.
+        f (fun): local update function
+        neighborhood (list[tuple], optional): cell neighborhood. Default MOORE.
+        duration (int, optional): maximal number of steps. Default 100.
+        termination (Termination, optional): conditions stopping the simulation before duration. Default None.
+        checkpoint (Checkpoint, optional): periodic checkpoints, the last step is always saved. Default None.
+        start (int, optional): step number of cellautomaton0, the simulation stops at step duration. Default 0.
+        active (bool, optional): apply f on the active region only (see ActiveRegion), the metabolites of the other cells are relaxed by EmptyStep.
+            The result is identical to the evaluation of the whole grid as long as f leaves empty cells surrounded by empty cells unchanged
+            except for their metabolites. The whole grid is evaluated at the steps where the active region covers more than
+            40% of it, which is then faster. Default True.
+        profile (Profiler, optional): instrumentation of the steps, stored in the profile attribute of the trace. Default None.
+        callback (fun, optional): callback(step, cellautomaton) called after each step, the simulation stops with the
+            termination "cancelled" if it returns True. Default None.
+        counts (CountWriter, optional): sink receiving the cell counts of every step. Default None.
+        events (EventCounter, optional): counters of the outcomes of the rule by phenotype, reported by f through Branch,
+            stored per step in the causes attribute of the trace. Default None.
+        seed (optional): seed of the random generator, set before the first step and recorded by counts.
+            Default None = the generator is left as it is.
+
+    Returns:
+        SimulationTrace: simulation trace, the reason of the termination is stored in its termination attribute.
     """
-    assert duration > 0
+    assert 0 <= start < duration
+    assert seed is None or start == 0, errmsg("A resumed run continues the random generator of its checkpoint", seed)
+    global _profiler, _events
+    phase = profile.phase if profile is not None else lambda name: nullcontext()
+    radius = max(max(abs(di), abs(dj)) for di, dj in neighborhood)
 
     def ca_step(cellautomaton: np.ndarray, f) -> np.ndarray:
-        n = len(cellautomaton)
+        n, m = cellautomaton.shape[:2]
         empty_cell = ("empty", (0.0, 0.0, 0.0, (None, None)))
         
-        # Initialize padded array with explicit 3D structure
-        padded = np.full((n+2, n+2, 2), empty_cell, dtype=object)
-        padded[1:-1, 1:-1, :] = cellautomaton
-        
-        # Mirror boundaries with explicit dimension handling
-        for dim in [0,1]:  # Handle both cell type and metabolites
-            padded[1:-1, 0, dim] = cellautomaton[:, 0, dim]  # Left
-            padded[1:-1, -1, dim] = cellautomaton[:, -1, dim]  # Right
-            padded[0, 1:-1, dim] = cellautomaton[0, :, dim]  # Top
-            padded[-1, 1:-1, dim] = cellautomaton[-1, :, dim]  # Bottom
-
-        # Proper neighborhood extraction
-        neighbor_offsets = np.array(neighborhood) + 1
-        neighbors = np.empty((n, n, len(neighborhood)), dtype=object)
-        
-        for idx, (di, dj) in enumerate(neighbor_offsets):
-            # Extract both components while maintaining structure
-            types = padded[di:di+n, dj:dj+n, 0]
-            metabolites = padded[di:di+n, dj:dj+n, 1]
+        with phase("padding"):
+            # Initialize padded array with explicit 3D structure
+            padded = np.full((n+2, m+2, 2), empty_cell, dtype=object)
+            padded[1:-1, 1:-1, :] = cellautomaton
             
-            # Combine into tuples
-            for i in range(n):
-                for j in range(n):
-                    neighbors[i,j,idx] = (types[i,j], metabolites[i,j])
+            # Mirror boundaries with explicit dimension handling
+            for dim in [0,1]:  # Handle both cell type and metabolites
+                padded[1:-1, 0, dim] = cellautomaton[:, 0, dim]  # Left
+                padded[1:-1, -1, dim] = cellautomaton[:, -1, dim]  # Right
+                padded[0, 1:-1, dim] = cellautomaton[0, :, dim]  # Top
+                padded[-1, 1:-1, dim] = cellautomaton[-1, :, dim]  # Bottom
 
-        canew = np.empty_like(cellautomaton)
-        for i in range(n):
-            for j in range(n):
-                new_cell = f(cellautomaton[i,j], neighbors[i,j])
+        neighbor_offsets = np.array(neighborhood) + 1
 
-                # maintaining the basement membrane:
-                if i == n - 1:
-                    canew[i,j] = (new_cell[0], (1.0, 1.0, 0.0, (new_cell[1][3][0], new_cell[1][3][1])))
+        def update(i: int, j: int, new_cell):
+            # maintaining the basement membrane:
+            if i == n - 1:
+                canew[i,j] = (new_cell[0], (1.0, 1.0, 0.0, (new_cell[1][3][0], new_cell[1][3][1])))
 
-                
-                # for non-basement cells
+            # for non-basement cells
+            else:
+                if "H" not in new_cell[0]:
+                    canew[i,j] = ("empty", (new_cell[1][0], new_cell[1][1], new_cell[1][2], (None, None)))
                 else:
-                    if "H" not in new_cell[0]:
-                        canew[i,j] = ("empty", (new_cell[1][0], new_cell[1][1], new_cell[1][2], (None, None)))
-                    else:
-                        canew[i,j] = new_cell
+                    canew[i,j] = new_cell
+
+        if profile is not None:
+            f, update = profile.wrap("rule", f), profile.wrap("basement", update)
+
+        if active:
+            with phase("neighbors"):
+                region = ActiveRegion(cellautomaton, radius)
+        if active and region.mean() <= _ACTIVEFRACTION:
+            # Empty cells far from any cell only relax their metabolites: vectorized update of the whole grid,
+            # then the rule is applied on the active region only.
+            with phase("EmptyStep"):
+                canew = EmptyStep(cellautomaton)
+            with phase("neighbors"):  # The rule and basement times spent in this loop are removed below.
+                if profile is not None:
+                    nested = profile.times["rule"] + profile.times["basement"]
+                for i, j in np.argwhere(region):
+                    cellneighbors = [(padded[i+di, j+dj, 0], padded[i+di, j+dj, 1]) for di, dj in neighbor_offsets]
+                    update(i, j, f(cellautomaton[i,j], cellneighbors))
+            if profile is not None:
+                profile.times["neighbors"] -= profile.times["rule"] + profile.times["basement"] - nested
+            return canew
+
+        with phase("neighbors"):
+            # Proper neighborhood extraction
+            neighbors = np.empty((n, m, len(neighborhood)), dtype=object)
+            
+            for idx, (di, dj) in enumerate(neighbor_offsets):
+                # Extract both components while maintaining structure
+                types = padded[di:di+n, dj:dj+m, 0]
+                metabolites = padded[di:di+n, dj:dj+m, 1]
+                
+                # Combine into tuples
+                for i in range(n):
+                    for j in range(m):
+                        neighbors[i,j,idx] = (types[i,j], metabolites[i,j])
+
+        canew = np.empty_like(cellautomaton)
+        for i in range(n):
+            for j in range(m):
+                update(i, j, f(cellautomaton[i,j], neighbors[i,j]))
                 
         return canew
 
-    simulation = [cellautomaton0]
+    def chunked_step(state: ChunkedCA, f) -> ChunkedCA:
+        # The window = chunks holding cells or non-uniform metabolites + 1 chunk of margin is materialized with a ring of
+        # one cell taken from the surrounding chunks, stepped by ca_step, and stored back without the ring.
+        # The empty uniform chunks outside the window only relax their metabolite profiles.
+        n, m = state.shape
+        size = state.size
+        new = ChunkedCA(state.shape, size, state.tol)
+        dense = [key for key, block in state.chunks.items() if block.dtype == object]
+        if dense:
+            bi, bj = zip(*dense)
+            r0, r1 = max(min(bi) - 1, 0) * size, min((max(bi) + 2) * size, n)
+            c0, c1 = max(min(bj) - 1, 0) * size, min((max(bj) + 2) * size, m)
+            R0, R1, C0, C1 = max(r0 - 1, 0), min(r1 + 1, n), max(c0 - 1, 0), min(c1 + 1, m)
+            window = ca_step(state.window(R0, R1, C0, C1), f)
+            new.store(r0, c0, window[r0-R0:r1-R0, c0-C0:c1-C0])
+        for key, block in state.chunks.items():
+            if key not in new.chunks:
+                new.chunks[key] = state.relax(key)
+        return new
+
+    step_fun = chunked_step if isinstance(cellautomaton0, ChunkedCA) else ca_step
+    simulation = SimulationTrace([cellautomaton0])
+    simulation.start = start
+    if termination is not None:
+        termination.reset(CountTypes(cellautomaton0))
+    if profile is not None:
+        _profiler, detach = profile, profile.attach(f)
+        simulation.profile = profile
+    if events is not None:
+        _events = events
+        events.reset()
+        simulation.causes = events.history
+        if start == 0:
+            events.endstep()
+    if counts is not None:
+        counts.open(cellautomaton0.shape[:2], "SimulateCA_BC", start, _params(f), seed)
+        if start == 0:
+            counts.write(0, CountTypes(cellautomaton0), CodeStack([cellautomaton0], counts.types)[0] if counts.stats else None,
+                         events.history[-1] if events is not None else None)
+    if seed is not None:
+        random.seed(seed)
+    completed = False
     try:
-        for i in tqdm(range(duration), desc="CA Step", ascii=False, 
-                     bar_format="{l_bar}{bar:65} {r_bar}", colour='#3c78d8'):
-            simulation.append(ca_step(simulation[i], f))
+        for i in _progress(range(duration - start)):
+            simulation.append(step_fun(simulation[i], f))
+            step = start + i + 1
+            if profile is not None:
+                profile.endstep(step)
+            caused = events.endstep() if events is not None else None
+            reason = None
+            counted = CountTypes(simulation[-1]) if termination is not None or counts is not None else None
+            if counts is not None:
+                counts.write(step, counted, CodeStack([simulation[-1]], counts.types)[0] if counts.stats else None, caused)
+            if termination is not None:
+                reason = termination.check(step, counted, StateHash(simulation[-1]))
+            if callback is not None and callback(step, simulation[-1]) and reason is None:
+                reason = "cancelled"
+            if checkpoint is not None and (step % checkpoint.every == 0 or step == duration or reason is not None):
+                SaveCheckpoint(checkpoint.path, Dense(simulation[-1]), step, duration, neighborhood,
+                               _params(f) if checkpoint.params is None else checkpoint.params)
+            if reason is not None:
+                simulation.termination = reason
+                break
+        completed = True
     except ValueError:
         errmsg("Invalid cell format in evolution function")
         exit()
+    finally:
+        if profile is not None:
+            _profiler = None
+            detach()
+        _events = None
+        if counts is not None:
+            counts.close(simulation.termination if completed else "interrupted")
 
     return simulation
 
 
+def ResumeCA_BC(path: str, f, duration: int = None, termination: Termination = None, checkpoint: Checkpoint = None,
+                counts: CountWriter = None) -> SimulationTrace:
+    """Resume a simulation from a checkpoint, the trajectory continues exactly as if the run had not been interrupted.
+    The model parameters saved in the checkpoint are set before the first step, by the SetParams of the module of f
+    (e.g. __main__ when BC.py is run) or by BC.SetParams if it has none.
+
+    Args:
+        path (str): checkpoint file saved by SimulateCA_BC.
+        f (fun): local update function, the same as the interrupted run.
+        duration (int, optional): total number of steps. Default None = duration of the interrupted run.
+        termination (Termination, optional): conditions stopping the simulation before duration. Default None.
+        checkpoint (Checkpoint, optional): periodic checkpoints of the resumed run. Default None.
+        counts (CountWriter, optional): sink of the cell counts, the count file of the interrupted run is continued. Default None.
+
+    Returns:
+        SimulationTrace: simulation trace starting from the checkpoint (see the start attribute).
+    """
+    module = sys.modules.get(getattr(f, "__module__", None))
+    if module is None or not hasattr(module, "SetParams"):
+        import BC as module  # BC imports this module, and seeds the random generator: import it before the restoration.
+    saved = LoadCheckpoint(path)
+    if saved["params"]:
+        module.SetParams(**saved["params"])
+    return SimulateCA_BC(saved["cellautomaton"], f,
+                         neighborhood=saved["neighborhood"],
+                         duration=saved["duration"] if duration is None else duration,
+                         termination=termination,
+                         checkpoint=checkpoint,
+                         start=saved["step"],
+                         counts=counts)
+
+
+def _stream(queue, cancelled, cellautomaton0, f, types: list, neighborhood: list, duration: int, seed):  # Process of BackgroundCA_BC.
+    def callback(_, cellautomaton) -> bool:
+        queue.put(CodeStack([cellautomaton], types)[0])
+        return cancelled.is_set()
+
+    simulation = SimulateCA_BC(cellautomaton0, f, neighborhood=neighborhood, duration=duration, callback=callback, seed=seed)
+    queue.put(simulation.termination)  # End of the stream.
+
+
+class BackgroundCA_BC:
+    """Simulation of SimulateCA_BC run in a background process. The frames are streamed as arrays of type codes
+    (see CodeStack) and collected by fetch, so that they can be displayed while the simulation goes on.
+
+    Args:
+        cellautomaton0 (np.ndarray): initial cellular automaton.
+        f (fun): local update function, it must be importable by the process (function defined at the top of a module).
+        types (list): cell types.
+        neighborhood (list[tuple], optional): cell neighborhood. Default MOORE.
+        duration (int, optional): number of steps. Default 100.
+        seed (optional): seed of the random generator of the simulation. Default None = a random seed.
+
+    Attributes:
+        first (np.ndarray): codes of the initial automaton.
+        params (dict): model parameters of the simulation (a0, pa, k, hN, hT, dg, dc).
+        seed: seed of the simulation.
+        running (bool): True until the end of the stream has been fetched.
+        termination (str): reason why the simulation stopped (see SimulateCA_BC), None while running.
+    """
+
+    def __init__(self, cellautomaton0: np.ndarray, f, types: list, neighborhood=Moore(1), duration: int = 100, seed=None):
+        self.types = types
+        self.duration = duration
+        self.params = _params(f)
+        self.seed = random.SystemRandom().randrange(2**32) if seed is None else seed
+        self.first = CodeStack([cellautomaton0], types)[0]
+        self.running = True
+        self.termination = None
+        self._queue = Queue()
+        self._cancelled = Event()
+        self._process = Process(target=_stream, daemon=True,
+                                args=(self._queue, self._cancelled, cellautomaton0, f, types, neighborhood, duration, self.seed))
+        self._process.start()
+
+    def fetch(self) -> list[np.ndarray]:  # Frames produced since the last call, without waiting.
+        frames = []
+        while self.running:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+            if isinstance(item, str):
+                self.running, self.termination = False, item
+                self._process.join()
+            else:
+                frames.append(item)
+        return frames
+
+    def cancel(self):  # Stop the simulation after the current step.
+        self._cancelled.set()
+
+
+# Parallel simulation: the automaton is encoded in shared memory (see EncodeCA) with two buffers, the current state and the next one.
+# The grid is split into row bands, each worker reads its band plus one halo row above and below in the current buffer
+# and writes its band in the next buffer.
+_worker = {}  # State of a worker process: shared arrays, rule, types, seed.
+
+
+def _attach(names: dict, shape: tuple, f, types: list, seed):  # Initializer of the worker processes.
+    _worker["shm"] = {key: [shared_memory.SharedMemory(name=name) for name in names[key]] for key in _STATEFIELDS}
+    _worker["arrays"] = {key: [np.ndarray(shape, dtype=_STATEFIELDS[key], buffer=buffer.buf) for buffer in _worker["shm"][key]]
+                         for key in _STATEFIELDS}
+    _worker["f"] = f
+    _worker["types"] = types
+    _worker["codes"] = {category: i for i, category in enumerate(types)}
+    _worker["seed"] = seed
+
+
+def _band_step(args: tuple) -> int:
+    """Compute one step of a band of rows [r0, r1) from the current buffer into the next one.
+
+    The random generator is seeded by (seed, step, band), the trajectory only depends on the seed and on the band split.
+    A daughter crossing a band boundary needs no exchange: the target is stored on the dividing cell and resolved
+    by the empty target cell which reads it in its halo, so every cell is only written by the band owning it.
+    """
+    step, band, r0, r1, current = args
+    f, types, codes = _worker["f"], _worker["types"], _worker["codes"]
+    arrays = {key: buffers[current] for key, buffers in _worker["arrays"].items()}
+    new = {key: buffers[1 - current] for key, buffers in _worker["arrays"].items()}
+    n, m = arrays["code"].shape
+    random.seed(f"{_worker['seed']}:{step}:{band}")
+
+    # Band + halo, the borders of the grid are mirrored and the corners of the grid are empty as in SimulateCA_BC.
+    lo, hi = max(r0 - 1, 0), min(r1 + 1, n)
+    padded = {}
+    for key, array in arrays.items():
+        rows = array[lo:hi]
+        if lo == r0:  # top of the grid
+            rows = np.concatenate((rows[:1], rows))
+        if hi == r1:  # bottom of the grid
+            rows = np.concatenate((rows, rows[-1:]))
+        padded[key] = np.pad(rows, ((0, 0), (1, 1)), mode="edge")
+    emptycell = {"code": codes["empty"], "glucose": 0.0, "oxygen": 0.0, "acid": 0.0, "target": -1, "daughter": 255}
+    for key, value in emptycell.items():
+        if lo == r0:
+            padded[key][0, [0, -1]] = value
+        if hi == r1:
+            padded[key][-1, [0, -1]] = value
+
+    # Metabolites of the band as if all cells were empty, see EmptyStep.
+    for key in ("glucose", "oxygen", "acid"):
+        level = padded[key]
+        new[key][r0:r1] = (((level[:-2, 1:-1] + level[1:-1, :-2]) + level[1:-1, 2:]) + level[2:, 1:-1]) / 4
+    if r1 == n:
+        new["glucose"][-1], new["oxygen"][-1], new["acid"][-1] = 1.0, 1.0, 0.0
+    new["code"][r0:r1] = codes["empty"]
+    new["target"][r0:r1] = -1
+    new["daughter"][r0:r1] = 255
+
+    # Rule on the active cells of the band, see ActiveRegion.
+    occupied = padded["code"] != codes["empty"]
+    active = np.zeros((r1 - r0, m), dtype=bool)
+    for di in range(3):
+        for dj in range(3):
+            active |= occupied[di:di+r1-r0, dj:dj+m]
+
+    columns = [padded[key].tolist() for key in _STATEFIELDS]
+
+    def cell(i: int, j: int) -> tuple:  # Cell at position (i, j) of the padded band.
+        code, glucose, oxygen, acid, target, daughter = (column[i][j] for column in columns)
+        return (types[code], (glucose, oxygen, acid, (_targetvalue(target), None if daughter == 255 else types[daughter])))
+
+    for i, j in np.argwhere(active).tolist():
+        phenotype, (glucose, oxygen, acid, (target, daughter)) = f(cell(i + 1, j + 1), [cell(i + 1 + di, j + 1 + dj) for di, dj in _MOORE1])
+        row = r0 + i
+        if row == n - 1:  # maintaining the basement membrane
+            glucose, oxygen, acid = 1.0, 1.0, 0.0
+        elif "H" not in phenotype:  # for non-basement cells
+            phenotype, target, daughter = "empty", None, None
+        new["code"][row, j] = codes[phenotype]
+        new["glucose"][row, j] = glucose
+        new["oxygen"][row, j] = oxygen
+        new["acid"][row, j] = acid
+        new["target"][row, j] = _targetcode(target)
+        new["daughter"][row, j] = 255 if daughter is None else codes[daughter]
+    return band
+
+
+def SimulateCA_BC_parallel(cellautomaton0: np.ndarray, f, types: list, duration: int = 100, workers: int = None,
+                           bands: int = None, seed=0, termination: Termination = None, record: int = 1,
+                           counts: CountWriter = None) -> SimulationTrace:
+    """Simulation of the BC automaton split into row bands computed in parallel, for very large grids.
+    The state is kept as typed arrays in shared memory, each worker reads one halo row above and below its band.
+    The trajectory is reproducible: it depends on the seed and the number of bands, not on the number of workers.
+    It is not the trajectory of SimulateCA_BC for the same seed since each band draws from its own random stream.
+
+    Args:
+        cellautomaton0 (np.ndarray): initial cellular automaton
+        f (fun): local update function, must be importable by the workers (defined at module level).
+        types (list): all the cell types which may appear, e.g. the types of cellcolors.
+        duration (int, optional): maximal number of steps. Default 100.
+        workers (int, optional): number of worker processes. Default None = number of cores.
+        bands (int, optional): number of row bands. Default None = number of workers.
+        seed (optional): seed of the random streams. Default 0.
+        termination (Termination, optional): conditions stopping the simulation before duration. Default None.
+        record (int, optional): keep one automaton every record steps in the trace (the last one is always kept). Default 1.
+        counts (CountWriter, optional): sink receiving the cell counts of every step, without event counts. Default None.
+
+    Returns:
+        SimulationTrace: simulation trace, the step numbers of the recorded automata are stored in its steps attribute.
+    """
+    assert duration > 0
+    assert record > 0
+    assert "empty" in types
+    assert counts is None or not counts.events, errmsg("SimulateCA_BC_parallel does not count events", "use SimulateCA_BC")
+    n, m = cellautomaton0.shape[:2]
+    workers = workers or os.cpu_count()
+    bands = min(bands or workers, n)
+    limits = np.linspace(0, n, bands + 1).astype(int)
+
+    state = EncodeCA(cellautomaton0, types)
+    shm = {key: [shared_memory.SharedMemory(create=True, size=state[key].nbytes) for _ in range(2)] for key in _STATEFIELDS}
+    arrays = {key: [np.ndarray((n, m), dtype=dtype, buffer=buffer.buf) for buffer in shm[key]] for key, dtype in _STATEFIELDS.items()}
+    for key in _STATEFIELDS:
+        arrays[key][0][:] = state[key]
+
+    simulation = SimulationTrace([cellautomaton0])
+    simulation.steps = [0]
+    if termination is not None:
+        termination.reset(CountTypes(state))
+    current = 0
+    completed = opened = False
+    try:  # From here on, the shared memory must be released whatever happens.
+        if counts is not None:
+            counts.open((n, m), "SimulateCA_BC_parallel", params=_params(f), seed=seed)
+            opened = True
+            counts.write(0, CountTypes(state), CodeStack([state], counts.types)[0] if counts.stats else None)
+        names = {key: [buffer.name for buffer in buffers] for key, buffers in shm.items()}
+        with Pool(workers, initializer=_attach, initargs=(names, (n, m), f, types, seed)) as pool:
+            for step in _progress(range(1, duration + 1)):
+                pool.map(_band_step, [(step, band, limits[band], limits[band + 1], current) for band in range(bands)])
+                current = 1 - current
+                code = arrays["code"][current]
+
+                reason = None
+                if termination is not None or counts is not None:
+                    counted = {types[i]: int(c) for i, c in enumerate(np.bincount(code.ravel(), minlength=len(types))) if c > 0}
+                if counts is not None:
+                    counts.write(step, counted, CodeStack([{"types": types, "code": code}], counts.types)[0] if counts.stats else None)
+                if termination is not None:
+                    reason = termination.check(step, counted, hash(code.tobytes()))
+                if step % record == 0 or step == duration or reason is not None:
+                    simulation.append(DecodeCA({"types": np.array(types)} | {key: arrays[key][current] for key in _STATEFIELDS}))
+                    simulation.steps.append(step)
+                if reason is not None:
+                    simulation.termination = reason
+                    break
+        completed = True
+    finally:
+        if opened:
+            counts.close(simulation.termination if completed else "interrupted")
+        arrays = code = None  # Release the views before closing the shared memory.
+        for buffer in (buffer for buffers in shm.values() for buffer in buffers):
+            buffer.close()
+            buffer.unlink()
+
+    return simulation
 
 
 def SimulateCA(cellautomaton0: np.ndarray, f, neighborhood=Moore(1), duration: int = 100) -> list:
@@ -241,7 +1420,7 @@ def SimulateCA(cellautomaton0: np.ndarray, f, neighborhood=Moore(1), duration: i
 
     simulation = [cellautomaton0]
     try:
-        for i in tqdm(range(duration), desc="CA Step", ascii=False, bar_format="{l_bar}{bar:65} {r_bar}", colour='#3d8c40'):  # With progress bar.
+        for i in _progress(range(duration), colour='#3d8c40'):  # With progress bar.
             simulation.append(ca_step(simulation[i], f))
     except ValueError:
         errmsg("Invalid cell format encountered. A condition on cell is probably missing in the local function.")
@@ -250,131 +1429,31 @@ def SimulateCA(cellautomaton0: np.ndarray, f, neighborhood=Moore(1), duration: i
     return simulation
 
 
-# Switch for managing the Boolean flags.
-class Switch:
-    """Boolean value toggling for switch control."""
-    state: bool
-
-    def __init__(self, val: bool = True):
-        self.state = val
-
-    def switch(self):  # Toggle the state.
-        self.state = not self.state
-        return self.state
-
-    def get(self):  # Get the state.
-        return self.state
-
-    def set(self, val: bool):  # Set the state.
-        self.state = val
-        return val
+def TypesCount(simulation: list, types) -> dict[str, list[int]]:
+    """Count the cells of each type along a simulation trace.
 
+    Args:
+        simulation (list): simulation trace.
+        types (iterable): cell types.
 
-_animation = None  # Variable storing the visualization, must be global.
-_autorun_button = None  # Button autorun ON/OFF.
-_save_button = None  # Button to save Simulation.
-_curve_button = None  # CheckBox Button for curves.
+    Returns:
+        dict[str, list[int]]: {type: count per step}.
+    """
+    return {category: [sum([CountType(row, category) for row in ca]) for ca in simulation] for category in types}
 
 
-def ShowSimulation(simulation: list, cellcolors: dict[tuple, str], figheight: int = 5, delay: int = 100):
-    """Display the simulation trace of a cellular automaton.
+def WriteCellCounts(typescount: dict[str, list[int]], filename: str = "cellcount.csv"):
+    """Save the cell counts of a simulation to a csv file, one row per iteration.
 
     Args:
-        simulation (list):  simulation trace
-        cellcolors (dict): colors assigned to cells
-        figheight (int, optional): height of the figure with figure size = (2*figheight,figheight). Defaults to 5.
-        delay (int, optional): delay in ms between two steps. Defaults to 100.
-
-    Returns:
-        _type_: animation
-    """
-    assert delay > 0
-    assert figheight > 0
-
-    global _autorun_button
-    global _save_button
-    global _curve_button
-    global _animation
-
-    # Preamble
-    n = len(simulation)
-    autorun = Switch()
-
-    # Figure definition
-    figtitle = "CELLULAR AUTOMATON - FD MASTER COURSE"  # Simulation title.
-
-    # Font style for all texts in the simulation window.
-    mpl.rcParams["font.family"] = "Helvetica"
-    mpl.rcParams["font.size"] = 11
-    mpl.rcParams["text.color"] = "black"
-
-    if plt.fignum_exists(figtitle):  # Activate and identify the figure if it already exists
-        plt.figure(figtitle)
-        fig = plt.gcf()
-        wm = plt.get_current_fig_manager()  # Get the window geometry and figure size
-        wgeometry = wm.window.geometry()
-        wgeometry = wgeometry[wgeometry.index("+"):]  # Keep the position only and remove the size. NECESSARY for appropriate figure scaling.
-        figsize = tuple(fig.get_size_inches())
-        plt.close(fig)  # ! Check if really needed, seems to avoid error.
-    else:  # Otherwise set the default figure parameters: position and size.
-        wgeometry = "+450+150"
-        figsize = (2 * figheight, figheight)
-
-    fig = plt.figure(figtitle, figsize=figsize)  # Create the simulation figure.
-    wm = plt.get_current_fig_manager()
-    wm.window.wm_geometry(wgeometry)
-
-    # Get colors and types of the cells
-    cells = list(cellcolors.keys())
-    types = {category: i for i, (category, *_) in enumerate(cells)}  # Types is a dictionary {category:position in cells}.
-    colors = [cellcolors[cell] for cell in cells]
-
-    # Axis of CA + initialization of the CA display.
-    X0 = 0.02  # Left bottom position of the CA
-    Y0 = 0.1
-    axca = fig.add_axes((X0, Y0, 0.45, 0.9))
-    axca.set_aspect('equal', adjustable='box', anchor=(0, 1))
-
-    # The cells are encoded by the index of the category in types to suit with array format of heatmap in DrawCA.
-    ca_heatmap = np.array([[types[category] for category, *_ in row] for row in simulation[0]])
-    caview = DrawCA(ca_heatmap, colors, axca).collections[0]
-
-    # Axe of curves
-    CHEIGHT: float = 0.87  # Height of the curve axe.
-    axcurve = fig.add_axes((X0 + 0.52, Y0, 0.44, CHEIGHT))
-    axcurve.set_xlim(0, n)
-    axcurve.set_ylim(0, len(simulation[0]) ** 2)
-    axcurve.grid(linestyle="--")
-
-    # Initialize the count curves.
-    typescount = {  # Dictionary keeping the count of the different cell types.
-        category: [sum([CountType(row, category) for row in ca]) for ca in simulation]
-        for category in types}
-
-
-    visible_curves = [thecolor != "white" for thecolor in colors]  # All the curves are visible but those drawn in white color.
-    curves = {  # The curves are collected to a dictionary {type: counting curve}.
-        category: axcurve.plot(
-            [0],
-            typescount[category][0],
-            color=colors[i] if colors[i] != "white" else "lightgray",  # The white color is transformed into a light gray.
-            linewidth=2.5,
-            marker=" ",
-            visible=visible_curves[i],
-        )[0]
-        for i, category in enumerate(types)}
-    
-    ########################################################################## 
-    ######## -------------- SAVING CELL COUNTS TO CSV --------------- ########
-    ##########################################################################
-    ## Added by Ngoc VU April 6th, 2025.
-
-    filename = "cellcount.csv"
-    header = ['Iteration'] + list(types.keys())
+        typescount (dict[str, list[int]]): {type: count per step}, see TypesCount.
+        filename (str, optional): csv file. Default "cellcount.csv".
+    """
+    header = ['Iteration'] + list(typescount.keys())
     data = []
 
-    for iteration in range(len(simulation)):
-        row = [iteration] + [typescount[category][iteration] for category in types]
+    for iteration in range(len(next(iter(typescount.values())))):
+        row = [iteration] + [typescount[category][iteration] for category in typescount]
         data.append(row)
 
     with open(filename, mode='w', newline='') as file:
@@ -382,464 +1461,167 @@ def ShowSimulation(simulation: list, cellcolors: dict[tuple, str], figheight: in
         writer.writerow(header)
         writer.writerows(data)
 
-    ##########################################################################
-    ##########################################################################
-    ##########################################################################
-
-    # || Check box button characterization for curves
-    chxboxheight = len(types) * 0.05  # Check box height which depends on the number of categories.
-    chxboxwidth = 0.05 + max(map(len, types)) * 0.006  # Check box width which depends  on the maximal string length of the categories.
-    axcurves = fig.add_axes(
-        (X0 + 0.52, Y0 + CHEIGHT - chxboxheight, chxboxwidth, chxboxheight))  # The checkboxes are located in the upper left of the curve graphics.
-
-    _curve_button = CheckButtons(axcurves, types, visible_curves)
-
-    def chxboxupdate(category: str) -> bool:  # Update the checkboxes.
-        return curves[category].set_visible(not curves[category].get_visible())  # Toggle the visibility of curve.
 
-    _curve_button.on_clicked(chxboxupdate)
+def CodeStack(simulation: list, types: list) -> np.ndarray:
+    """Convert a simulation trace into a stack of type codes, the code of a type being its position in types.
 
-    # || Slider definition to control the progression of the simulation
-    axslider = fig.add_axes((X0 + 0.04, Y0 - 0.07, 0.412, 0.07))  # The slider is located below the cellular automaton display.
-    slider = Slider(axslider, "", 0, n - 1, valstep=1, valinit=0, facecolor="gray", valfmt="%3d")
-
-    xrange = np.arange(0, n, 1, dtype=int)
-
-    def updateslider(step):  # Update of the slider.
-        ca_coded = np.array([[types[category] for category, *_ in row] for row in simulation[step]])
-        caview.set_array(ca_coded)  # Update CA
-        for category in types:  # Update type count curves
-            curves[category].set_data(xrange[:step], typescount[category][:step])
-        return
+    Args:
+        simulation (list): simulation trace of automata, chunked automata or encoded automata (see EncodeCA).
+        types (list): cell types.
 
-    slider.on_changed(updateslider)  # Event on slider.
+    Returns:
+        np.ndarray: codes of shape (steps, rows, columns) and type uint8.
+    """
+    codes = {category: i for i, category in enumerate(types)}
+    frames = []
+    for ca in simulation:
+        if isinstance(ca, dict):
+            remap = np.array([codes[str(category)] for category in ca["types"]], dtype=np.uint8)
+            frames.append(remap[ca["code"]])
+        else:
+            ca = Dense(ca)
+            found, inverse = np.unique(ca[:, :, 0].astype(str), return_inverse=True)
+            remap = np.array([codes[category] for category in found], dtype=np.uint8)
+            frames.append(remap[inverse].reshape(ca.shape[:2]))
+    return np.stack(frames)
 
-    # || ON/OFF autorun Button.
-    ax_autorun_button = fig.add_axes((X0 + 0.02, Y0 - 0.05, 0.015, 0.03))  # ON/OFF button is on the left side of slider.
-    _autorun_button = Button(ax_autorun_button, " ")
 
-    # Button labeling to indicate autorun status.
-    OFF_ICON: str = "$\u25a0$"  # Square
-    ON_ICON: str = "$\u25B6$"  # Right triangle
+def CodeCounts(codes: np.ndarray, types: list) -> dict[str, list[int]]:
+    """Count the cells of each type at every step of a code stack (see CodeStack).
 
-    def buttonlabeling(state: bool):  # Set the label ON/OFF to the button w.r.t. to a Boolean state.
-        _autorun_button.label.set_text({False: ON_ICON, True: OFF_ICON}[state])
+    Returns:
+        dict[str, list[int]]: {type: count per step}.
+    """
+    counts = np.stack([np.bincount(frame.ravel(), minlength=len(types)) for frame in codes])
+    return {category: counts[:, i].tolist() for i, category in enumerate(types)}
 
-    buttonlabeling(autorun.get())  # Initialize button label from the initial autorun state.
 
-    def click_autorun_button(_):  # autorun button call back
-        global _autorun_button
-        autorun.switch()  # Switch the autorun.
-        buttonlabeling(autorun.get())  # Update the button label.
+def SaveTrajectory(path: str, simulation: list, types: list):
+    """Save the type codes of a simulation trace (see CodeStack) in a compressed .npz file, read by LoadTrajectory.
 
-    _autorun_button.on_clicked(click_autorun_button)  # Event on autorun button.
+    Args:
+        path (str): trajectory file (.npz).
+        simulation (list): simulation trace.
+        types (list): cell types.
+    """
+    steps = getattr(simulation, "steps", None) or list(range(getattr(simulation, "start", 0), getattr(simulation, "start", 0) + len(simulation)))
+    np.savez_compressed(path, codes=CodeStack(simulation, types), types=np.array(types), steps=np.array(steps))
 
-    # || Button to save Animation
-    ax_save_button = fig.add_axes((X0, Y0 - 0.05, 0.015, 0.03))  # ON/OFF button is on the left side of slider.
-    SAVED_ICON = "$\u25BD$"  # Triangle pointing down, empty shape
-    SAVE_ICON = "$\u25BC$"  # Triangle pointing down, filled shape
-    _save_button = Button(ax_save_button, SAVE_ICON)
-    saved = Switch(False)
 
-    def click_save_button(_):
-        global _save_button
-        fps = 1000 // delay  # Estimation of the fps from the delay between frames to have the same time.
-        writer = PillowWriter(fps=fps)
-        _animation.save("CA-SIMULATION.gif", writer=writer)
-        msgput("Save completed!")
-        saved.set(True)
-        _save_button.label.set_text(SAVED_ICON)
+def LoadTrajectory(path: str) -> tuple[np.ndarray, list, list]:
+    """Load a trajectory saved by SaveTrajectory.
 
-    _save_button.on_clicked(click_save_button)  # Event on save button.
+    Returns:
+        tuple[np.ndarray, list, list]: code stack, cell types and step numbers.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return data["codes"], [str(category) for category in data["types"]], [int(step) for step in data["steps"]]
 
-    # || Tooltips handler
-    axmsg = fig.add_axes((X0, Y0 - 0.09, 0.45, 0.03), facecolor="gainsboro")  # The message box is below the slider
 
-    def msgclear():  # Clear the message box.
-        axmsg.cla()
-        axmsg.set_xticks([])
-        axmsg.set_yticks([])
+def Palette(cellcolors: dict[tuple, str]) -> np.ndarray:
+    """RGB colors of the cell types in the order of cellcolors.
 
-    def msgput(msg: str):  # Print a message in the message box.
-        msgclear()
-        axmsg.text(0.01, 0.2, msg, fontsize=8, fontfamily='Helvetica', fontstyle='italic')
+    Returns:
+        np.ndarray: palette of shape (types, 3) and type uint8.
+    """
+    from matplotlib.colors import to_rgb  # no pyplot nor backend is loaded
+    return np.array([[round(255 * channel) for channel in to_rgb(thecolor)] for thecolor in cellcolors.values()], dtype=np.uint8)
+
+
+def _render(args: tuple) -> list[bytes]:  # Frames of codes enlarged by an integer factor and encoded, computed by the worker processes.
+    codes, scale, palette, extension = args
+    frames = np.repeat(np.repeat(codes, scale, axis=-2), scale, axis=-1)
+    if extension == ".mp4":
+        return [palette[frames].tobytes()]  # raw RGB for ffmpeg
+    from PIL import Image
+    encoded = []
+    for frame in frames:  # Each frame of a GIF has its own LZW stream: one single-frame GIF per frame.
+        image = Image.fromarray(frame, mode="P")
+        image.putpalette(palette.ravel().tolist())
+        buffer = io.BytesIO()
+        image.save(buffer, format="GIF", optimize=False)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def _gifparts(data: bytes) -> tuple[bytes, bytes]:
+    """Split a single-frame GIF into its head (header, screen descriptor and global palette) and its image
+    (descriptor and LZW data), the extensions and the trailer are dropped."""
+    assert data[:6] == b"GIF89a" or data[:6] == b"GIF87a", errmsg("Not a GIF", data[:6])
+    position = 13 + (3 * 2 ** ((data[10] & 7) + 1) if data[10] & 0x80 else 0)
+    head = b"GIF89a" + data[6:position]
+    while data[position] == 0x21:  # extension: label then data sub-blocks
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+    assert data[position] == 0x2C and data[-1] == 0x3B, errmsg("Unexpected GIF block", data[position])
+    return head, data[position:-1]
+
+
+def ExportSimulation(simulation, cellcolors: dict[tuple, str], filename: str = "CA-SIMULATION.gif", scale: int = 4,
+                     fps: int = 10, workers: int = None, batch: int = 32):
+    """Export a simulation as a GIF or MP4 movie straight from the cell types, without matplotlib.
+    Each cell is a square of scale x scale pixels colored by cellcolors. The frames are rendered and encoded by a pool
+    of worker processes and written as they come: the GIF frames by Pillow in palette mode (no color quantization),
+    each with its own LZW stream, then concatenated into one GIF, the MP4 by ffmpeg which must be installed.
 
-    # || Handling events: move + click on the axes.
-    def hover(event):
-        if ax_save_button.contains(event)[0]:
-            if saved.get():
-                msgput("Click to save the simulation in GIF - Simulation already saved.")
-            else:
-                msgput("Click to save the simulation in GIF.")
-        elif ax_autorun_button.contains(event)[0]:
-            msgput("Click to turn ON/OFF the simulation: " + OFF_ICON + " = OFF, " + ON_ICON + " = ON.")
-        elif axca.contains(event)[0]:
-            msgput("Cellular Automaton.")
-        elif axcurve.contains(event)[0]:
-            msgput("Type count curves.")
-        else:
-            msgclear()
+    Args:
+        simulation (list | np.ndarray | str): simulation trace, code stack (see CodeStack) or trajectory file (see SaveTrajectory).
+        cellcolors (dict): colors assigned to cells.
+        filename (str, optional): movie file, the format is given by the extension .gif or .mp4. Default "CA-SIMULATION.gif".
+        scale (int, optional): pixels per cell side. Default 4.
+        fps (int, optional): frames per second. Default 10.
+        workers (int, optional): number of worker processes. Default None = number of CPUs.
+        batch (int, optional): number of frames sent to a worker at once. Default 32.
+    """
+    assert scale > 0 and fps > 0 and batch > 0
+    types = [category for category, *_ in cellcolors]
+    if isinstance(simulation, str):
+        codes, saved, _ = LoadTrajectory(simulation)
+        codes = np.array([types.index(category) for category in saved], dtype=np.uint8)[codes]
+    elif isinstance(simulation, np.ndarray) and simulation.dtype == np.uint8:
+        codes = simulation
+    else:
+        codes = CodeStack(simulation, types)
+    palette = Palette(cellcolors)
+    _, n, m = codes.shape
+    width, height = m * scale, n * scale
+    extension = os.path.splitext(filename)[1].lower()
+    batches = [(codes[t:t+batch], scale, palette, extension) for t in range(0, len(codes), batch)]
+
+    if extension == ".mp4":
+        if shutil.which("ffmpeg") is None:
+            errmsg("ffmpeg is required to export", filename)
+            return
+        # libx264 needs even dimensions: the frames are padded by one pixel if necessary.
+        ffmpeg = subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+             "-i", "-", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", "-c:v", "libx264", filename],
+            stdin=subprocess.PIPE)
+    elif extension != ".gif":
+        errmsg("Unknown movie format", filename)
+        return
+    else:
+        movie = open(filename, "wb")
+
+    # Graphic control extension of every GIF frame: delay in 1/100 s, no transparency.
+    control = b"\x21\xf9\x04\x00" + round(100 / fps).to_bytes(2, "little") + b"\x00\x00"
+
+    with Pool(workers) as pool:
+        for frames in pool.imap(_render, batches):
+            for frame in frames:
+                if extension == ".mp4":
+                    ffmpeg.stdin.write(frame)
+                    continue
+                head, image = _gifparts(frame)
+                if movie.tell() == 0:
+                    movie.write(head + b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")  # loop forever
+                movie.write(control + image)
+    if extension == ".mp4":
+        ffmpeg.stdin.close()
+        ffmpeg.wait()
+    else:
+        movie.write(b"\x3b")
+        movie.close()
 
-    def onclick(event):
-        if ax_save_button.contains(event)[0]:
-            msgput("Save in progress.")
-        elif ax_autorun_button.contains(event)[0]:
-            msgput("Simulation switched " + ("OFF, scroll the slider." if autorun.get() else "ON."))
-        else:
-            pass
-
-    fig.canvas.mpl_connect("motion_notify_event", hover)
-    fig.canvas.mpl_connect("button_press_event", onclick)
-
-    msgclear()  # Initially clear the message box.
-
-    # || Display simulation
-    def updateanimation(_):  # Update from animation.
-        if autorun.get():  # The update is conditional on the state of autorun.
-            step = (slider.val + 1) % slider.valmax
-            slider.set_val(step)  # Updating slider value also triggers the updateslider function
-
-    _animation = FuncAnimation(fig, updateanimation, interval=delay, save_count=n)  # Run animation.
-    fig.show()
-    return _animation
-
-
-# Class to manage weights for random definition of the CA grid.
-class Weights:
-    """Weights = dictionary associating cells to their weights which are floats between 0 and 1"""
-    weights: dict = {}
-
-    def __init__(self, types: list, value: float = 0.0):
-        self.weights = {category: value for category in types}
-
-    def set(self, category, val):  # Set the weight of a category.
-        self.weights[category] = val
-
-    def get(self, category):  # Get the weight of a state.
-        return self.weights[category]
-
-
-# Global variables used to pass arguments in sliders and buttons in GuiCA
-_gridsize = 1  # CA grid.
-_duration = 1  # Duration of the simulation.
-_cell = None  # Current cell used to paint the selected area with this cell.
-_ca0 = None  # CA0 = initial automaton.
-_neighborfun = Moore  # Function qualifying the neighborhood shape (Moore or VonNeumann).
-_radius = 1  # neighborhood radius
-# Widgets
-_radiotypes = None  # Radio button of NEW window.
-_selector = None  # Cell selector of NEW window.
-_neighbors_radio = None  # neighborhood radio button
-
-
-def GuiCA(
-        local_fun,
-        cellcolors: dict,
-        figheight: int = 5,
-        gridsize: int = 100,
-        duration: int = 200,
-        delay: int = 100
-):
-    """Graphical interface for cellular Automata.
-        The number of different cell types is limited to 10 at most.
-
-    Args:
-        local_fun (function): local update function of the CA.
-        cellcolors (dict): {cell:color} colors associated to cells. Recall that a cell is a tuple (type, states ...)
-        figheight (int, optional): height of the figure of the simulation view. Defaults to 5.
-        gridsize (int, optional): maximal size of the CA grid. Defaults to 100.
-        duration (int, optional): maximal duration of the simulation. Defaults to 200.
-        delay (int, optional): delay in ms between two simulation steps. Defaults to 100.
-    """
-    assert all([isinstance(cell, tuple) for cell in cellcolors])  # Check that keys are tuples.
-    assert all([isinstance(category, str) for category, *_ in cellcolors])  # check that the types are strings.
-    assert len(cellcolors) <= 10  # limit to 10 parameters - see program to understand this limitation.
-    assert figheight > 0
-    assert gridsize > 0
-    assert duration > 0
-    assert delay > 0
-
-    global _gridsize
-    global _duration
-    global _neighbors_radio
-
-    # Windows parameters
-    GUIWIDTH: float = 1.5  # Minimal width of the GUI figure.
-    GUISTRSTRIDE: float = 0.12  # Stride associated to character used for figure width definition.
-    GUIHEIGHT: float = 5.5  # Height of the GUI figure. This value must be adapted to the number of types.
-    # Rectangles
-    FRMLEFT: float = 0.07  # Frame left position
-    FRMHEIGHT: float = 0.86  # Frame size
-    FRMEDGECOLOR: str = "darkgray"  # Frame color
-    # Button & Slider parameters
-    MAXRADIUS: int = 3  # Maximal neighborhood radius.
-    SLIDLEFT: float = 0.35  # Left position of sliders.
-    SLIDSIZE: float = 0.4  # Size of sliders.
-    WIDGHEIGHT: float = 0.07  # Height of sliders and buttons.
-    SLIDSTART: float = 0.67  # Vertical start position for weight sliders.
-    SLIDDIST: float = 0.05  # Distance between two weight sliders.
-    SLIDCOLOR: str = "gray"  # Slider color bar.
-    # Radio button parameters
-    RADIOFFSET: float = 0.015  # Minimal incompressible distance in a radio button.
-    RADIOSTRSTRIDE: float = 0.010  # Stride for characters in radio button.
-    RADIOSTRIDE: float = 0.01  # Stride between two radio buttons.
-    BUTTONCOLOR: str = "silver"  # Standard color of buttons.
-    HOVERCOLOR: str = "lightsalmon"  # Hover color of buttons.
-    UNSELECTCOLOR: str = "lemonchiffon"  # Color of the radio button when it is unselected.
-    SELECTCOLOR: str = "gold"  # Color of the radio button when it is selected.
-
-    # Initialization of the main variables
-    _gridsize = gridsize // 2
-    _duration = duration #// 2
-    cells = list(cellcolors.keys())
-    types = [category for category, *_ in cells]  # Get all types of cells
-    colors = cellcolors.values()
-    n = len(types)
-    weights = Weights(types, 0.5)  # Create weights from types.
-
-    # Initialization of the figure
-    mpl.rcParams["toolbar"] = "None"  # No toolbars on GUI figure.
-    mpl.rcParams["font.family"] = "sans"
-    mpl.rcParams["font.size"] = 8
-
-    figui = plt.figure(figsize=(GUIWIDTH + max(map(len, types)) * GUISTRSTRIDE, GUIHEIGHT), num="GUI")
-    ax = figui.add_axes((0, 0, 1, 1))
-    wm = plt.get_current_fig_manager()
-    wm.window.wm_geometry("+50+100")
-
-    # || Slider of neighborhood radius ===
-    axradius_slider = figui.add_axes((SLIDLEFT, 0.93, SLIDSIZE, WIDGHEIGHT))
-    radius_slider = Slider(
-        axradius_slider,
-        "Radius  ",
-        1,
-        MAXRADIUS,
-        valstep=1,
-        valinit=1,
-        facecolor=SLIDCOLOR,
-        valfmt="%3d",
-    )
-
-    def update_radius_slider(val):  # Event of radius slider
-        global _radius
-        _radius = val
-
-    radius_slider.on_changed(update_radius_slider)
-
-    # || Neighborhood radio button ===
-    axneighbors_radio = figui.add_axes((FRMLEFT, 0.86, FRMHEIGHT, WIDGHEIGHT))
-    for pos in ['left', 'bottom', 'right', 'top']:
-        axneighbors_radio.spines[pos].set_color(FRMEDGECOLOR)
-        axneighbors_radio.spines[pos].set_linewidth(2)
-
-    # Dictionary for neighborhood selection. The values are neighborhood function.
-    neighborhood = {"Moore": Moore, "Von Neumann": VonNeumann}
-    _neighbors_radio = RadioButtons(axneighbors_radio,
-                                    list(neighborhood.keys()),
-                                    activecolor=BUTTONCOLOR,
-                                    radio_props={'s': 30}, )
-
-    def neighborsclick(label):  # Radio neighborhood callback.
-        global _neighborfun
-        _neighborfun = neighborhood[label]
-
-    _neighbors_radio.on_clicked(neighborsclick)
-
-    # || Grid size slider ======
-    axsize_slider = figui.add_axes((SLIDLEFT, 0.79, SLIDSIZE, WIDGHEIGHT))
-    size_slider = Slider(
-        axsize_slider,
-        "Size  ",
-        1,
-        gridsize,
-        valstep=1,
-        valinit=_gridsize,
-        facecolor=SLIDCOLOR,
-        valfmt="%3d",
-    )
-
-    def update_slider_size(val):
-        global _gridsize
-        _gridsize = val
-
-    size_slider.on_changed(update_slider_size)  # Event on size slider
-
-    # || Duration/Time sliders ======
-    axduration_slider = figui.add_axes((SLIDLEFT, 0.74, SLIDSIZE, WIDGHEIGHT))
-    duration_slider = Slider(
-        axduration_slider,
-        "Time  ",
-        1,
-        duration,
-        valstep=1,
-        valinit=_duration,
-        facecolor=SLIDCOLOR,
-        valfmt="%3d",
-    )
-
-    def update_slider_duration(val: int):
-        global _duration
-        _duration = val
-
-    duration_slider.on_changed(update_slider_duration)  # Event on duration slider
-
-    # || Weights  sliders ======
-    # Rectangle
-    ax.add_patch(
-        Rectangle(
-            (FRMLEFT, 0.2),
-            FRMHEIGHT,
-            0.54,
-            facecolor="whitesmoke",
-            edgecolor=FRMEDGECOLOR,
-            linewidth=2,
-        )
-    )
-
-    # Weight sliders definition
-    weight_sliders = [
-        Slider(
-            figui.add_axes((SLIDLEFT, SLIDSTART - i * SLIDDIST, SLIDSIZE, WIDGHEIGHT), facecolor=SLIDCOLOR, ),
-            str(types[i]) + "  ",
-            0.0,
-            1.0,
-            valstep=0.005,
-            valinit=0.5,
-            facecolor=SLIDCOLOR,
-            valfmt="%1.3f",
-        ) for i in range(n)
-    ]
-
-    # All possible updates for 10 weight sliders at most.
-    # ! I don't find a better solution than setting i for types[i] by an explicit number.
-    # [lambda val:weights.set(types[i],val) for i in range(n)] and [lambda val:weights.set(category,val) for category in types]  DOES NOT WORK (i = max for all buttons !?)
-    weight_update_fun = [
-        lambda val: weights.set(types[0], val),
-        lambda val: weights.set(types[1], val),
-        lambda val: weights.set(types[2], val),
-        lambda val: weights.set(types[3], val),
-        lambda val: weights.set(types[4], val),
-        lambda val: weights.set(types[5], val),
-        lambda val: weights.set(types[6], val),
-        lambda val: weights.set(types[7], val),
-        lambda val: weights.set(types[8], val),
-        lambda val: weights.set(types[9], val),
-    ]
-
-    for i in range(n):  # Link events to weight sliders
-        weight_sliders[i].on_changed(weight_update_fun[i])
-
-    # || New CA button ===
-    axnew_button = figui.add_axes((FRMLEFT, 0.11, FRMHEIGHT, WIDGHEIGHT))
-    new_button = Button(axnew_button, "NEW", color=BUTTONCOLOR, hovercolor=HOVERCOLOR)
-
-    def newclick(_):  # Callback of NEW button.
-        global _cell
-        global _ca0
-        global _radiotypes
-        global _selector
-
-        # Figure of initial CA generation
-        figca0_title = "CA0"
-
-        if plt.fignum_exists(figca0_title):  # If the figure already exists then use it.
-            plt.figure(figca0_title)  # Activate the figure of CA0.
-            figca0 = plt.gcf()
-        else:  # Otherwise create a new figure for the visualization of the initial CA = CA0.
-            figsize = (figheight, figheight + 0.5)
-            figca0 = plt.figure(figca0_title, figsize=figsize)
-            window_manager = plt.get_current_fig_manager()
-            window_manager.window.wm_geometry("+450+150")
-
-        # Cellular automata initialization - generation of the initial CA (CA0).
-        axca0 = figca0.add_axes((0.01, 0.0, 0.98, 0.98))
-        plt.subplots_adjust(bottom=0.1)
-        axca0.set_aspect('equal', anchor=(0.5, 1.0))  # The CA0 drawing is anchored in the middle top.
-
-        _ca0 = GenerateCA_BC(_gridsize, cellcolors, weights.weights)
-        ca0code = np.array([[types.index(category) for category, *_ in row] for row in _ca0])
-        ca0view = DrawCA(ca0code, list(colors), axca0).collections[0]
-
-        # Radio button of categories
-        radiofullwidth = n * (max(map(len, types)) * RADIOSTRSTRIDE + RADIOSTRIDE + RADIOFFSET)  # Full width of the button bar.
-        radiospacing = radiofullwidth / n  # Distance between 2 radio buttons.
-
-        axradio = [figca0.add_axes(((0.5 - radiofullwidth / 2) + i * radiospacing + RADIOSTRIDE, 0.02, radiospacing - RADIOSTRIDE, WIDGHEIGHT / 1.5))
-                   for i in range(n)]
-
-        _radiotypes = [Button(axradio[i], category, color=UNSELECTCOLOR, hovercolor=HOVERCOLOR) for i, category in enumerate(types)]
-        for rb in _radiotypes:  # Set style of the radio button labels.
-            rb.label.set_fontfamily("Helvetica")
-            rb.label.set_fontsize(8)
-
-        # Initialization of the radio button bar
-        _radiotypes[0].color = SELECTCOLOR  # The first button is the default button. Assign to the color 'selected'
-        _cell = list(cellcolors.keys())[0]  # the default cell is the first one in cellcolors.
-
-        def radioclick(index: int):  # Radio click call back with the index of the type as input.
-            global _cell
-            for radiotype in _radiotypes:  # Unselect all radio buttons.
-                radiotype.color = UNSELECTCOLOR
-            _radiotypes[index].color = SELECTCOLOR  # Select the radio button corresponding to index.
-            _cell = cells[index]
-
-        radioclickfun = [  # Manually pre-defined 10 on-click radio-button functions. the problem is the same as weight sliders.
-            lambda _: radioclick(0),
-            lambda _: radioclick(1),
-            lambda _: radioclick(2),
-            lambda _: radioclick(3),
-            lambda _: radioclick(4),
-            lambda _: radioclick(5),
-            lambda _: radioclick(6),
-            lambda _: radioclick(7),
-            lambda _: radioclick(8),
-            lambda _: radioclick(9)]
-        for i in range(n):
-            _radiotypes[i].on_clicked(radioclickfun[i])
-
-        # || Region Selector
-        def onselect(_1, _2):
-            global _cell
-            xmin, xmax, ymin, ymax = (round(val) for val in _selector.extents)
-            _ca0[ymin:ymax, xmin:xmax] = _cell  # Fill the selected array area with the default cell.
-            category, *_ = _cell
-            ca0code[ymin:ymax, xmin:xmax] = types.index(category)  # Fill the array view area with the index of _cell category.
-            ca0view.set_array(ca0code)
-
-        _selector = RectangleSelector(axca0,
-                                      onselect,
-                                      button=[1, 3],
-                                      interactive=False,
-                                      spancoords='data',
-                                      use_data_coordinates=True,
-                                      props=dict(facecolor='red', edgecolor='black', linewidth=2, alpha=0.3, fill=True),
-                                      )
-
-        figca0.show()
-        return  # * end of newclick function
-
-    new_button.on_clicked(newclick)
-
-    # || Run Button ======
-    axrun_button = figui.add_axes((FRMLEFT, 0.025, FRMHEIGHT, WIDGHEIGHT))
-    run_button = Button(axrun_button, "RUN", color=BUTTONCOLOR, hovercolor=HOVERCOLOR)
-
-    def runclick(_):  # Run Button clicked
-        global _gridsize
-        global _duration
-        global _animation
-        global _ca0
-        global _neighborfun
-        global _radius
-
-        if _ca0 is None:  # When CA0 is not yet generated.
-            _ca0 = GenerateCA_BC(_gridsize, cellcolors, weights.weights)
-
-        simulation = SimulateCA_BC(_ca0, local_fun, neighborhood=_neighborfun(_radius), duration=_duration)
-        _animation = ShowSimulation(simulation, cellcolors, figheight=figheight, delay=delay)
-
-    run_button.on_clicked(runclick)  # Event on button
-
-    plt.show(block=True)
-
-    return  # End of GuiCA
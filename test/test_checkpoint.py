@@ -0,0 +1,67 @@
+
+# Checkpoints and resumption of SimulateCA_BC.
+#   python -m pytest test
+
+import importlib.util
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import BC
+from cellularautomata_BC import (Checkpoint, CountTypes, Dense, EncodeCA, GenerateCA_BC, LoadCheckpoint, ResumeCA_BC,
+                                 SimulateCA_BC)
+
+TYPES = [category for category, *_ in BC.cellcolors]
+
+
+def test_resume_sets_the_parameters_of_the_rule_module(tmp_path):
+    # A copy of BC under another name, as the rule of "python BC.py" lives in __main__ and not in BC.
+    spec = importlib.util.spec_from_file_location("BC_main", BC.__file__)
+    rule = importlib.util.module_from_spec(spec)
+    sys.modules["BC_main"] = rule
+    a0 = BC.a0
+    try:
+        spec.loader.exec_module(rule)
+        rule.SetParams(a0=0.3)
+        random.seed(1)
+        path = str(tmp_path / "checkpoint.npz")
+        SimulateCA_BC(GenerateCA_BC(10, BC.cellcolors), rule.BC, duration=4, checkpoint=Checkpoint(path, every=2))
+        assert LoadCheckpoint(path)["params"]["a0"] == 0.3
+
+        rule.SetParams(a0=0.1)
+        ResumeCA_BC(path, rule.BC, duration=5)
+        assert rule.a0 == 0.3
+    finally:
+        del sys.modules["BC_main"]
+        BC.SetParams(a0=a0)  # SetParams also sets BC_utils, shared with BC.
+
+
+def Tumor(n: int = 16):
+    """Automaton of n x n cells with a layer of H cells on the basement membrane."""
+    cellautomaton = GenerateCA_BC(n, BC.cellcolors)
+    for j in range(n):
+        cellautomaton[n - 2, j] = ("H", cellautomaton[n - 2, j][1])
+    return cellautomaton
+
+
+def Same(a, b) -> bool:
+    """Same cell types, metabolite levels, targets and daughters."""
+    a, b = EncodeCA(Dense(a), TYPES), EncodeCA(Dense(b), TYPES)
+    return all(np.array_equal(a[key], b[key]) for key in ("code", "glucose", "oxygen", "acid", "target", "daughter"))
+
+
+def test_resume_is_bit_identical(tmp_path):
+    cellautomaton0 = Tumor()
+    random.seed(4)
+    full = SimulateCA_BC(cellautomaton0, BC.BC, duration=12)
+
+    path = str(tmp_path / "checkpoint.npz")
+    random.seed(4)
+    SimulateCA_BC(cellautomaton0, BC.BC, duration=6, checkpoint=Checkpoint(path, every=3))
+    random.seed(99)  # The generator is restored from the checkpoint.
+    resumed = ResumeCA_BC(path, BC.BC, duration=12)
+    assert resumed.start == 6 and len(resumed) == 7
+    assert CountTypes(full[-1]).get("H", 0) > 16  # The tumor grew.
+    assert all(Same(a, b) for a, b in zip(full[6:], resumed))
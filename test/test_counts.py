@@ -0,0 +1,88 @@
+
+# Count files written by CountWriter.
+#   python -m pytest test
+
+import json
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import BC
+from BC_fast import SimulateCA_BC_fast
+from cellularautomata_BC import (Checkpoint, CountWriter, GenerateCA_BC, ReadCounts, ResumeCA_BC, SimulateCA_BC,
+                                 SimulateCA_BC_parallel)
+
+TYPES = [category for category, *_ in BC.cellcolors]
+PARAMS = ("a0", "pa", "k", "hN", "hT", "dg", "dc")
+
+
+def Sidecar(path: str) -> dict:
+    with open(path + ".json") as file:
+        return json.load(file)
+
+
+def test_sidecar_reference(tmp_path):
+    counts = CountWriter(str(tmp_path / "reference.csv"), TYPES)
+    SimulateCA_BC(GenerateCA_BC(10, BC.cellcolors), BC.BC, duration=3, counts=counts, seed=5)
+    metadata = Sidecar(counts.path)
+    assert metadata["seed"] == 5
+    assert {name: metadata["params"][name] for name in PARAMS} == {name: getattr(BC, name) for name in PARAMS}
+
+
+def test_sidecar_parallel(tmp_path):
+    counts = CountWriter(str(tmp_path / "parallel.csv"), TYPES)
+    SimulateCA_BC_parallel(GenerateCA_BC(10, BC.cellcolors), BC.BC, TYPES, duration=3, workers=1, seed=5, counts=counts)
+    metadata = Sidecar(counts.path)
+    assert metadata["seed"] == 5
+    assert set(PARAMS) <= set(metadata["params"])
+
+
+def test_sidecar_fast(tmp_path):
+    counts = CountWriter(str(tmp_path / "fast.csv"), TYPES, {"run": 2})
+    SimulateCA_BC_fast(GenerateCA_BC(10, BC.cellcolors), TYPES, duration=3, seed=5, params={"a0": 0.2}, counts=counts)
+    metadata = Sidecar(counts.path)
+    assert metadata["seed"] == 5
+    assert metadata["params"]["a0"] == 0.2 and metadata["params"]["run"] == 2
+    assert set(PARAMS) <= set(metadata["params"])
+
+
+def test_sidecar_gui(tmp_path):
+    SaveCounts = pytest.importorskip("cellularautomata_gui", exc_type=ImportError).SaveCounts  # needs a display (TkAgg)
+    params = {name: getattr(BC, name) for name in PARAMS}
+    path = SaveCounts({"empty": [90, 89], "normal": [10, 10], "H": [0, 1]}, str(tmp_path / "run_{started}.csv"), (10, 10),
+                      "completed", params, 7)
+    metadata = Sidecar(path)
+    assert metadata["seed"] == 7
+    assert {name: metadata["params"][name] for name in PARAMS} == params
+
+
+@pytest.mark.parametrize("format", ["csv", "columns"])
+def test_interrupted_counts_are_resumed(tmp_path, format):
+    cellautomaton0 = GenerateCA_BC(12, BC.cellcolors)
+    for j in range(12):
+        cellautomaton0[10, j] = ("H", cellautomaton0[10, j][1])
+    template = str(tmp_path / "{name}_{pathway}")
+    full = CountWriter(template, TYPES, {"name": "full"}, format=format, label=lambda typescount: "done")
+    SimulateCA_BC(cellautomaton0, BC.BC, duration=12, counts=full, seed=4)
+
+    def crash(step, _):
+        if step == 8:
+            raise RuntimeError("crash")
+
+    checkpoint = str(tmp_path / "checkpoint.npz")
+    counts = CountWriter(template, TYPES, {"name": "run"}, format=format, buffer=1, label=lambda typescount: "done")
+    with pytest.raises(RuntimeError):
+        SimulateCA_BC(cellautomaton0, BC.BC, duration=12, counts=counts, seed=4, callback=crash,
+                      checkpoint=Checkpoint(checkpoint, every=6))
+    assert counts.path.endswith("run_running")  # Kept for the resumption, with the rows up to step 8.
+    assert ReadCounts(counts.path)["Iteration"].tolist() == list(range(9))
+    assert Sidecar(counts.path)["termination"] == "interrupted"
+
+    counts = CountWriter(template, TYPES, {"name": "run"}, format=format, label=lambda typescount: "done")
+    ResumeCA_BC(checkpoint, BC.BC, counts=counts)  # From step 6: the rows 7 and 8 are written again.
+    assert counts.path.endswith("run_done") and Sidecar(counts.path)["seed"] == 4
+    resumed, expected = ReadCounts(counts.path), ReadCounts(full.path)
+    assert resumed["Iteration"].tolist() == list(range(13))
+    assert all(np.array_equal(resumed[column], expected[column]) for column in ["Iteration"] + TYPES)
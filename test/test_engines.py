@@ -0,0 +1,59 @@
+
+# Equivalence of the ways of running SimulateCA_BC: active region, parallel bands, chunked storage.
+#   python -m pytest test
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import BC
+from cellularautomata_BC import (ActiveRegion, ChunkedCA, CountTypes, Dense, EncodeCA, GenerateCA_BC, SimulateCA_BC,
+                                 SimulateCA_BC_parallel)
+
+TYPES = [category for category, *_ in BC.cellcolors]
+
+
+def Tumor(n: int = 24):
+    """Automaton of n x n cells with a layer of H cells on the basement membrane."""
+    cellautomaton = GenerateCA_BC(n, BC.cellcolors)
+    for j in range(n):
+        cellautomaton[n - 2, j] = ("H", cellautomaton[n - 2, j][1])
+    return cellautomaton
+
+
+def Same(a, b) -> bool:
+    """Same cell types, metabolite levels, targets and daughters."""
+    a, b = EncodeCA(Dense(a), TYPES), EncodeCA(Dense(b), TYPES)
+    return all(np.array_equal(a[key], b[key]) for key in ("code", "glucose", "oxygen", "acid", "target", "daughter"))
+
+
+def test_active_region_equals_full_grid():
+    cellautomaton0 = Tumor()
+    assert ActiveRegion(cellautomaton0).mean() < 0.4  # The active region path is taken.
+    random.seed(2)
+    active = SimulateCA_BC(cellautomaton0, BC.BC, duration=10, active=True)
+    random.seed(2)
+    full = SimulateCA_BC(cellautomaton0, BC.BC, duration=10, active=False)
+    assert CountTypes(full[-1]).get("H", 0) > 24
+    assert all(Same(a, b) for a, b in zip(active, full))
+
+
+def test_parallel_does_not_depend_on_workers():
+    cellautomaton0 = Tumor()
+    one = SimulateCA_BC_parallel(cellautomaton0, BC.BC, TYPES, duration=8, workers=1, bands=3, seed=7)
+    two = SimulateCA_BC_parallel(cellautomaton0, BC.BC, TYPES, duration=8, workers=2, bands=3, seed=7)
+    assert one.steps == two.steps == list(range(9))
+    assert CountTypes(one[-1]).get("H", 0) > 24
+    assert all(Same(a, b) for a, b in zip(one, two))
+
+
+def test_chunked_equals_dense():
+    cellautomaton0 = Tumor(32)
+    random.seed(2)
+    dense = SimulateCA_BC(cellautomaton0, BC.BC, duration=10)
+    random.seed(2)
+    chunked = SimulateCA_BC(ChunkedCA.FromDense(cellautomaton0, 8, tol=0), BC.BC, duration=10)
+    assert any(chunk.dtype != object for chunk in chunked[-1].chunks.values())  # Empty chunks kept as profiles.
+    assert all(Same(a, b) for a, b in zip(dense, chunked))
@@ -0,0 +1,50 @@
+
+# Termination conditions of the simulation engines.
+#   python -m pytest test
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BC
+from BC_fast import SimulateCA_BC_fast
+from cellularautomata_BC import GenerateCA_BC, SimulateCA_BC, Termination
+
+TYPES = [category for category, *_ in BC.cellcolors]
+
+
+def TumorAtTop(n: int = 20, rows: int = 3):
+    """Automaton of n x n cells whose first rows are H cells, too far from the basement membrane to produce enough ATP."""
+    cellautomaton = GenerateCA_BC(n, BC.cellcolors)
+    for i in range(rows):
+        for j in range(n):
+            cellautomaton[i, j] = ("H", cellautomaton[i, j][1])
+    return cellautomaton
+
+
+def test_extinction_fast():
+    simulation = SimulateCA_BC_fast(TumorAtTop(), TYPES, duration=50, seed=1, params={"pa": 0},
+                                    termination=Termination())
+    assert simulation.termination == "extinction"
+    assert sum(simulation.typescount[category][-1] for category in TYPES if category not in ("empty", "normal")) == 0
+    assert simulation.typescount["normal"][-1] > 0  # The basement membrane is still there.
+
+
+def test_extinction_reference():
+    pa = BC.pa
+    BC.SetParams(pa=0)
+    try:
+        random.seed(1)
+        simulation = SimulateCA_BC(TumorAtTop(), BC.BC, duration=50, termination=Termination())
+    finally:
+        BC.SetParams(pa=pa)
+    assert simulation.termination == "extinction"
+    assert len(simulation) < 51
+
+
+def test_no_extinction_before_a_tumor():
+    # The initial automaton has no tumor cell: the run must not stop as extinct before one appears.
+    simulation = SimulateCA_BC_fast(GenerateCA_BC(20, BC.cellcolors), TYPES, duration=20, seed=1, params={"pa": 0},
+                                    termination=Termination())
+    assert simulation.termination != "extinction"